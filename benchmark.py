@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+
+# Reproducible benchmarks for watch_folder_player.py and rank_videos.py.
+# Synthetic clips are generated with ffmpeg's lavfi testsrc, every case runs in its own
+# headless process (offscreen Qt platform) and the results are printed as JSON so runs
+# can be compared across commits.
+
+CODECS = {"h264": "libx264", "mpeg4": "mpeg4", "hevc": "libx265"}
+# The corpus is complete before a case starts, so the watcher's settle time at startup
+# would only add a fixed wait to every timing
+BENCH_SETTLE_MS = 0
+
+
+def generate_corpus(root, count, codec, duration, size="320x180"):
+    # Clips are cached by their parameters so repeated runs reuse them
+    folder = os.path.join(root, f"clips_{codec}_{count}x{duration}s")
+    marker = os.path.join(folder, ".complete")
+    if os.path.exists(marker):
+        return folder
+    shutil.rmtree(folder, ignore_errors=True)
+    os.makedirs(folder)
+    source = os.path.join(folder, "source.mp4")
+    subprocess.run(
+        [
+            "ffmpeg", "-v", "error", "-y",
+            "-f", "lavfi", "-i", f"testsrc=duration={duration}:size={size}:rate=25",
+            "-f", "lavfi", "-i", f"sine=frequency=440:duration={duration}",
+            "-c:v", CODECS[codec], "-c:a", "aac", "-shortest", source,
+        ],
+        check=True,
+    )
+    # Copies of one encode are enough for probing/concat costs and keep generation fast
+    for index in range(count):
+        shutil.copyfile(source, os.path.join(folder, f"clip_{index:06d}.mp4"))
+    os.remove(source)
+    open(marker, "w").close()
+    return folder
+
+
+def generate_tree(root, count, files_per_folder=100):
+    # Empty files are enough for the ranker, which never decodes during ingestion
+    folder = os.path.join(root, f"tree_{count}")
+    marker = os.path.join(folder, ".complete")
+    if os.path.exists(marker):
+        return folder
+    shutil.rmtree(folder, ignore_errors=True)
+    for index in range(count):
+        subfolder = os.path.join(folder, f"d{index // files_per_folder:05d}")
+        os.makedirs(subfolder, exist_ok=True)
+        open(os.path.join(subfolder, f"clip_{index:06d}.mp4"), "w").close()
+    open(marker, "w").close()
+    return folder
+
+
+class SubprocessCounter:
+    # Counts every external process started through subprocess or QProcess jobs
+    def __init__(self):
+        import ffmpeg_jobs
+
+        self.count = 0
+        original_popen_init = subprocess.Popen.__init__
+        original_job_start = ffmpeg_jobs.FfmpegJob.start
+        counter = self
+
+        def popen_init(self, *args, **kwargs):
+            counter.count += 1
+            original_popen_init(self, *args, **kwargs)
+
+        def job_start(self):
+            counter.count += 1
+            original_job_start(self)
+
+        subprocess.Popen.__init__ = popen_init
+        ffmpeg_jobs.FfmpegJob.start = job_start
+
+
+def wait_until(condition, timeout=600):
+    from PyQt6.QtCore import QCoreApplication
+
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise TimeoutError("benchmark case did not finish in time")
+        QCoreApplication.processEvents()
+        time.sleep(0.002)
+
+
+def player_idle(player):
+    return (
+        not player.watcher.starting
+        and player.probe_runner.is_idle()
+        and player.build_runner.is_idle()
+        and player.transcode_runner.is_idle()
+        and player.build is None
+        and not player.rebuild_timer.isActive()
+    )
+
+
+def run_case(case, params):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+
+    app = QApplication([sys.argv[0]])
+    counter = SubprocessCounter()
+    folder = params["folder"]
+
+    if case in ("load_playlist_cold", "load_playlist_warm", "create_concatenated_video",
+                "create_concatenated_video_incremental", "get_video_duration"):
+        from watch_folder_player import VideoPlayer, METADATA_CACHE_NAME
+
+        if case == "load_playlist_cold":
+            for name in os.listdir(folder):
+                if name.startswith(METADATA_CACHE_NAME):
+                    os.remove(os.path.join(folder, name))
+
+    if case in ("load_playlist_cold", "load_playlist_warm"):
+        start = time.perf_counter()
+        player = VideoPlayer(folder, mode="playlist", settle_ms=BENCH_SETTLE_MS)
+        wait_until(lambda: player_idle(player) and len(player.playlist) == params["clips"])
+        elapsed = time.perf_counter() - start
+    elif case == "get_video_duration":
+        from metadata_cache import MetadataCache
+
+        empty_folder = tempfile.mkdtemp()
+        player = VideoPlayer(empty_folder, mode="playlist", settle_ms=BENCH_SETTLE_MS)
+        player.metadata_cache = MetadataCache(os.path.join(empty_folder, "bench.db"))
+        paths = [os.path.join(folder, name) for name in sorted(os.listdir(folder)) if name.endswith(".mp4")]
+        start = time.perf_counter()
+        for path in paths:
+            player.get_video_duration(path)
+        elapsed = time.perf_counter() - start
+    elif case in ("create_concatenated_video", "create_concatenated_video_incremental"):
+        incremental = case.endswith("incremental")
+        player = VideoPlayer(folder, mode="concat", incremental=incremental, settle_ms=BENCH_SETTLE_MS)
+        wait_until(lambda: player_idle(player))
+        # Build the second buffer as well, so both outputs are in their steady state
+        player.create_concatenated_video()
+        wait_until(lambda: player_idle(player))
+        # Time a refresh of an unchanged folder, i.e. the cost of one loop
+        start = time.perf_counter()
+        player.create_concatenated_video()
+        wait_until(lambda: player_idle(player))
+        elapsed = time.perf_counter() - start
+    elif case == "add_videos_from_folder":
+        os.chdir(tempfile.mkdtemp())
+        from rank_videos import VideoRanker
+
+        ranker = VideoRanker()
+        start = time.perf_counter()
+        ranker.add_videos_from_folder(folder)
+        wait_until(lambda: len(ranker.video_model) >= params["clips"])
+        elapsed = time.perf_counter() - start
+    elif case == "populate_video_list_from_processed_videos":
+        os.chdir(tempfile.mkdtemp())
+        paths = []
+        for root, _, files in os.walk(folder):
+            paths.extend(os.path.join(root, name) for name in files if name.endswith(".mp4"))
+        with open("processed_videos.json", "w") as f:
+            json.dump({path: 1 + index % 5 for index, path in enumerate(paths)}, f)
+        from rank_videos import VideoRanker
+
+        start = time.perf_counter()
+        ranker = VideoRanker()
+        elapsed = time.perf_counter() - start
+    else:
+        raise ValueError(f"Unknown benchmark case {case}")
+
+    usage_self = resource.getrusage(resource.RUSAGE_SELF)
+    usage_children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        "wall_time": elapsed,
+        "subprocesses": counter.count,
+        "peak_rss_kb": usage_self.ru_maxrss,
+        "children_peak_rss_kb": usage_children.ru_maxrss,
+    }
+
+
+def run_isolated(case, params):
+    # A fresh interpreter per case keeps peak RSS and caches independent between cases
+    command = [sys.executable, os.path.abspath(__file__), "--run-case", case, "--params", json.dumps(params)]
+    result = subprocess.run(command, stdout=subprocess.PIPE, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        return {"error": f"exit code {result.returncode}"}
+    return json.loads(result.stdout.decode().strip().splitlines()[-1])
+
+
+def git_commit():
+    result = subprocess.run(
+        ["git", "rev-parse", "HEAD"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return result.stdout.decode().strip() or None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the video tools on synthetic clips")
+    parser.add_argument("--counts", default="10,100", help="comma-separated clip counts")
+    parser.add_argument("--tree-counts", default="1000,10000", help="file counts for the ranker cases")
+    parser.add_argument("--codecs", default="h264", help=f"comma-separated, from {', '.join(CODECS)}")
+    parser.add_argument("--duration", type=int, default=2, help="seconds per synthetic clip")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "video_tools_bench"))
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    parser.add_argument("--params", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case, json.loads(args.params))))
+        return
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    results = []
+    for codec in args.codecs.split(","):
+        for count in [int(c) for c in args.counts.split(",")]:
+            folder = generate_corpus(args.work_dir, count, codec, args.duration)
+            for case in (
+                "get_video_duration",
+                "load_playlist_cold",
+                "load_playlist_warm",
+                "create_concatenated_video",
+                "create_concatenated_video_incremental",
+            ):
+                params = {"folder": folder, "clips": count}
+                result = run_isolated(case, params)
+                result.update(case=case, codec=codec, clips=count, clip_duration=args.duration)
+                results.append(result)
+                print(json.dumps(result), file=sys.stderr)
+
+    for count in [int(c) for c in args.tree_counts.split(",")]:
+        folder = generate_tree(args.work_dir, count)
+        for case in ("add_videos_from_folder", "populate_video_list_from_processed_videos"):
+            result = run_isolated(case, {"folder": folder, "clips": count})
+            result.update(case=case, clips=count)
+            results.append(result)
+            print(json.dumps(result), file=sys.stderr)
+
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import sqlite3
+from PyQt6.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+from metadata_cache import file_signature, partial_content_hash
+
+
+class HashSignals(QObject):
+    finished = pyqtSignal(object, list)  # The task, [(path, signature, hash, cached)]
+
+
+class HashTask(QRunnable):
+    def __init__(self, paths, entries):
+        super().__init__()
+        self.paths = paths
+        # Only read from the worker; single dict lookups are safe while the GUI thread
+        # adds entries
+        self.entries = entries
+        self.signals = HashSignals()
+        self.setAutoDelete(False)
+
+    def run(self):
+        results = []
+        for video_path in self.paths:
+            try:
+                signature = file_signature(video_path)
+                entry = self.entries.get(video_path)
+                if entry is not None and entry[0] == signature:
+                    results.append((video_path, signature, entry[1], True))
+                else:
+                    results.append((video_path, signature, partial_content_hash(video_path), False))
+            except OSError:
+                continue
+        self.signals.finished.emit(self, results)
+
+
+class ContentIndex(QObject):
+    # Partial content hashes of clips, computed on a thread pool and cached by
+    # (path, size, mtime) in SQLite, so a clip is recognised after a rename, a copy to
+    # another folder or a remount without being read again.
+    hashed = pyqtSignal(list)  # [(path, content hash)]
+
+    def __init__(self, db_path, max_workers=2, batch_size=64, parent=None):
+        super().__init__(parent)
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS content_hashes (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, hash TEXT)"
+        )
+        self.connection.commit()
+        self.entries = {}  # path -> ((size, mtime), hash)
+        for video_path, size, mtime, content_hash in self.connection.execute(
+            "SELECT path, size, mtime, hash FROM content_hashes"
+        ):
+            self.entries[video_path] = ((size, mtime), content_hash)
+
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers)
+        self.tasks = []
+
+    def hash_for(self, video_path):
+        entry = self.entries.get(video_path)
+        return entry[1] if entry is not None else None
+
+    def request(self, paths, priority=1):
+        # Results arrive in batches through hashed; lower priority batches wait for the rest
+        paths = list(paths)
+        for start in range(0, len(paths), self.batch_size):
+            task = HashTask(paths[start:start + self.batch_size], self.entries)
+            task.signals.finished.connect(self.task_finished)
+            self.tasks.append(task)
+            self.pool.start(task, priority)
+
+    def task_finished(self, task, results):
+        self.tasks.remove(task)
+        new_entries = [
+            (video_path, signature[0], signature[1], content_hash)
+            for video_path, signature, content_hash, cached in results
+            if not cached
+        ]
+        for video_path, size, mtime, content_hash in new_entries:
+            self.entries[video_path] = ((size, mtime), content_hash)
+        if new_entries:
+            with self.connection:
+                self.connection.executemany("INSERT OR REPLACE INTO content_hashes VALUES (?, ?, ?, ?)", new_entries)
+        self.hashed.emit([(video_path, content_hash) for video_path, _, content_hash, _ in results])
+
+    def rename(self, source, dest):
+        # A move keeps the content, so the hash carries over to the new path
+        entry = self.entries.pop(source, None)
+        if entry is None:
+            return
+        try:
+            signature = file_signature(dest)
+        except OSError:
+            return
+        self.entries[dest] = (signature, entry[1])
+        with self.connection:
+            self.connection.execute("DELETE FROM content_hashes WHERE path = ?", (source,))
+            self.connection.execute(
+                "INSERT OR REPLACE INTO content_hashes VALUES (?, ?, ?, ?)",
+                (dest, signature[0], signature[1], entry[1]),
+            )
+
+    def close(self):
+        self.pool.clear()
+        self.pool.waitForDone()
+        self.connection.close()
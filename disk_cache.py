@@ -0,0 +1,61 @@
+import os
+
+
+class DiskCache:
+    # Directory of generated files (transcodes, thumbnails, ...) addressed by a key and
+    # capped in total size. A file's mtime doubles as its last-used time, so the least
+    # recently used entries are evicted first.
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def path_for(self, key, suffix):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def temp_path_for(self, key, suffix):
+        # Keep the real extension last so ffmpeg can still infer the output format
+        return os.path.join(self.cache_dir, key + ".part" + suffix)
+
+    def lookup(self, key, suffix):
+        path = self.path_for(key, suffix)
+        try:
+            os.utime(path)  # Mark as recently used
+        except OSError:
+            return None
+        return path
+
+    def commit(self, temp_path, key, suffix):
+        # Move a finished file into place atomically, then enforce the size cap
+        path = self.path_for(key, suffix)
+        os.replace(temp_path, path)
+        self.evict(keep=path)
+        return path
+
+    def discard(self, temp_path):
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+    def evict(self, keep=None):
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if not entry.is_file() or ".part." in entry.name:
+                    continue
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
@@ -0,0 +1,149 @@
+import os
+import time
+from collections import deque
+from PyQt6.QtCore import QObject, QProcess, QIODevice, pyqtSignal
+
+from metrics import metrics
+
+
+class FfmpegJob(QObject):
+    # Runs one ffmpeg/ffprobe command through QProcess without blocking the event loop.
+    # Progress is parsed from "-progress" output when the command asks for it.
+    progress = pyqtSignal(float)  # Fraction done, 0.0 - 1.0
+    finished = pyqtSignal(object)  # The job itself
+
+    def __init__(self, command, duration=None, output_file=None, append=False, parent=None):
+        super().__init__(parent)
+        self.command = command
+        self.duration = duration  # Expected output duration in seconds, for progress
+        self.output_file = output_file
+        self.append = append
+        self.stdout = bytearray()
+        self.stderr = bytearray()
+        self.returncode = None
+        self.cancelled = False
+        self.process = None
+        self.partial_line = b""
+
+    def start(self):
+        self.process = QProcess(self)
+        if self.output_file is not None:
+            mode = QIODevice.OpenModeFlag.Append if self.append else QIODevice.OpenModeFlag.Truncate
+            self.process.setStandardOutputFile(self.output_file, mode)
+        self.process.readyReadStandardOutput.connect(self.read_stdout)
+        self.process.readyReadStandardError.connect(self.read_stderr)
+        self.process.finished.connect(self.process_finished)
+        self.process.errorOccurred.connect(self.process_error)
+        self.process.start(self.command[0], self.command[1:])
+
+    def is_running(self):
+        return self.process is not None and self.process.state() != QProcess.ProcessState.NotRunning
+
+    def succeeded(self):
+        return self.returncode == 0 and not self.cancelled
+
+    def cancel(self):
+        self.cancelled = True
+        if self.is_running():
+            self.process.kill()
+        elif self.returncode is None:
+            self.returncode = -1
+            self.finished.emit(self)
+
+    def read_stdout(self):
+        data = bytes(self.process.readAllStandardOutput())
+        self.stdout += data
+        self.parse_progress(data)
+
+    def read_stderr(self):
+        data = bytes(self.process.readAllStandardError())
+        self.stderr += data
+        self.parse_progress(data)
+
+    def parse_progress(self, data):
+        if not self.duration:
+            return
+        lines = (self.partial_line + data).split(b"\n")
+        self.partial_line = lines.pop()
+        for line in lines:
+            key, _, value = line.strip().partition(b"=")
+            # out_time_ms is reported in microseconds as well, despite its name
+            if key in (b"out_time_us", b"out_time_ms") and value.isdigit():
+                self.progress.emit(min(1.0, int(value) / 1e6 / self.duration))
+            elif key == b"progress" and value == b"end":
+                self.progress.emit(1.0)
+
+    def process_finished(self, exit_code, exit_status):
+        if self.returncode is not None:
+            return
+        if exit_status == QProcess.ExitStatus.CrashExit:
+            self.returncode = -1
+        else:
+            self.returncode = exit_code
+        self.finished.emit(self)
+
+    def process_error(self, error):
+        if error == QProcess.ProcessError.FailedToStart and self.returncode is None:
+            print(f"Error: could not start {self.command[0]}")
+            self.returncode = -1
+            self.finished.emit(self)
+
+
+class JobRunner(QObject):
+    # Queue of FfmpegJobs with a cap on how many processes run at the same time.
+    # name labels the runner's jobs in the metrics (e.g. "probe", "build").
+    def __init__(self, max_concurrent=2, name="jobs", parent=None):
+        super().__init__(parent)
+        self.max_concurrent = max_concurrent
+        self.name = name
+        self.queue = deque()
+        self.running = []
+        self.started_count = 0
+
+    def submit(self, job):
+        job.setParent(self)
+        job.finished.connect(self.job_finished)
+        if metrics.enabled:
+            job.queued_at = time.monotonic()
+        self.queue.append(job)
+        self.start_next()
+        return job
+
+    def start_next(self):
+        while self.queue and len(self.running) < self.max_concurrent:
+            job = self.queue.popleft()
+            if job.cancelled:
+                continue
+            self.running.append(job)
+            self.started_count += 1
+            if metrics.enabled:
+                job.started_at = time.monotonic()
+                metrics.observe("subprocess_queue_seconds", job.started_at - job.queued_at, runner=self.name)
+            job.start()
+
+    def job_finished(self, job):
+        if job in self.running:
+            self.running.remove(job)
+            if metrics.enabled:
+                if job.cancelled:
+                    status = "cancelled"
+                else:
+                    status = "ok" if job.returncode == 0 else "failed"
+                metrics.observe(
+                    "subprocess_seconds",
+                    time.monotonic() - job.started_at,
+                    runner=self.name,
+                    program=os.path.basename(job.command[0]),
+                    status=status,
+                )
+        elif job in self.queue:
+            self.queue.remove(job)
+        job.deleteLater()
+        self.start_next()
+
+    def cancel_all(self):
+        for job in list(self.queue) + list(self.running):
+            job.cancel()
+
+    def is_idle(self):
+        return not self.queue and not self.running
@@ -0,0 +1,71 @@
+import os
+import time
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from metrics import metrics
+
+
+class FolderScanThread(QThread):
+    # Walks folder trees with scandir off the GUI thread and hands accepted files over
+    # in batches: small and frequent at first so the first clips show up right away,
+    # then capped so a huge tree does not flood the event loop.
+    batchFound = pyqtSignal(list)
+    progress = pyqtSignal(int, int)  # Folders scanned, files found
+
+    def __init__(self, roots, accept, batch_size=500, batch_interval=0.1, parent=None):
+        super().__init__(parent)
+        self.roots = list(roots)
+        self.accept = accept
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        # Depth first like os.walk: a folder's files, then its subfolders in name order
+        started = time.monotonic()
+        stack = list(reversed(self.roots))
+        batch = []
+        folders = 0
+        found = 0
+        last_emit = time.monotonic()
+        while stack and not self.cancelled:
+            folder = stack.pop()
+            subfolders = []
+            try:
+                with os.scandir(folder) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError as e:
+                print(f"Error scanning {folder}: {e}")
+                continue
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subfolders.append(entry.path)
+                    elif entry.is_file() and self.accept(entry.name):
+                        batch.append(entry.path)
+                except OSError:
+                    continue
+            stack.extend(reversed(subfolders))
+            folders += 1
+
+            now = time.monotonic()
+            if batch and (len(batch) >= self.batch_size or now - last_emit >= self.batch_interval or not found):
+                found += len(batch)
+                self.batchFound.emit(batch)
+                self.progress.emit(folders, found)
+                batch = []
+                last_emit = now
+
+        if batch and not self.cancelled:
+            found += len(batch)
+            self.batchFound.emit(batch)
+        self.progress.emit(folders, found)
+
+        elapsed = time.monotonic() - started
+        metrics.observe("folder_scan_seconds", elapsed, source="scan")
+        metrics.count("scanned_files_total", found, source="scan")
+        if elapsed > 0:
+            metrics.set("scan_files_per_second", found / elapsed, source="scan")
@@ -0,0 +1,127 @@
+import os
+import time
+from PyQt6.QtCore import QObject, QFileSystemWatcher, QTimer, pyqtSignal
+
+from metrics import metrics
+
+
+class FolderWatcher(QObject):
+    # Watches a folder for added and removed files. A new file is only reported once
+    # its size and mtime have stopped changing, so clips that are still being copied
+    # in are never picked up half-written. A new name is always seen twice, settle_ms
+    # apart, before it is accepted: copies that keep the source's mtime (cp -p, rsync,
+    # unzip) look settled on their first sighting.
+    filesAdded = pyqtSignal(list)
+    filesRemoved = pyqtSignal(list)
+    ready = pyqtSignal()  # The files that were there at start() have been checked
+
+    def __init__(self, folder_path, accept=None, debounce_ms=500, settle_ms=2000, parent=None):
+        super().__init__(parent)
+        self.folder_path = folder_path
+        self.accept = accept or (lambda name: True)
+        self.settle_seconds = settle_ms / 1000
+
+        self.known = {}  # name -> (size, mtime) of accepted files
+        self.pending = {}  # name -> (size, mtime) of files that are still being written
+        self.starting = False
+
+        # Bursts of filesystem events collapse into a single scan
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(debounce_ms)
+        self.debounce_timer.timeout.connect(self.scan)
+
+        # Files that are still changing are re-checked until they settle
+        self.settle_timer = QTimer(self)
+        self.settle_timer.setSingleShot(True)
+        self.settle_timer.setInterval(settle_ms)
+        self.settle_timer.timeout.connect(self.scan)
+
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.schedule_scan)
+
+    def start(self):
+        # Files that are already there go through the normal settle check as well. The
+        # ones that pass on the second look make up files() when ready is emitted, the
+        # ones still being written are reported with filesAdded later.
+        self.watcher.addPath(self.folder_path)
+        self.scan(emit=False)
+        if self.pending:
+            self.starting = True
+        else:
+            self.ready.emit()
+
+    def stop(self):
+        self.watcher.removePaths(self.watcher.directories())
+        self.debounce_timer.stop()
+        self.settle_timer.stop()
+
+    def files(self):
+        return list(self.known)
+
+    def schedule_scan(self, path=None):
+        self.debounce_timer.start()
+
+    def list_folder(self):
+        # None when the folder could not be listed, e.g. a share that is briefly away;
+        # a file that disappears while it is being listed is just left out
+        entries = {}
+        try:
+            with os.scandir(self.folder_path) as it:
+                for entry in it:
+                    try:
+                        if entry.is_file() and self.accept(entry.name):
+                            stat = entry.stat()
+                            entries[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError as e:
+            print(f"Error scanning {self.folder_path}: {e}")
+            return None
+        return entries
+
+    def scan(self, emit=True):
+        starting = self.starting
+        self.starting = False
+        emit = emit and not starting
+        now = time.time()
+        started = time.monotonic()
+        entries = self.list_folder()
+        metrics.observe("folder_scan_seconds", time.monotonic() - started, source="watcher")
+        if entries is None:
+            # Keep what is known rather than reporting every file as removed; try again
+            self.starting = starting
+            self.settle_timer.start()
+            return [], []
+        added = []
+        removed = [name for name in self.known if name not in entries]
+        for name in removed:
+            del self.known[name]
+        for name in [name for name in self.pending if name not in entries]:
+            del self.pending[name]
+
+        for name, signature in entries.items():
+            if self.known.get(name) == signature:
+                continue
+            if name in self.known:
+                # Modified in place: drop it until the new version has settled
+                del self.known[name]
+                removed.append(name)
+            settled = now - signature[1] / 1e9 >= self.settle_seconds
+            if settled and self.pending.get(name) == signature:
+                self.pending.pop(name, None)
+                self.known[name] = signature
+                added.append(name)
+            else:
+                self.pending[name] = signature
+
+        if self.pending:
+            self.settle_timer.start()
+        if emit:
+            if removed:
+                self.filesRemoved.emit(removed)
+            if added:
+                self.filesAdded.emit(sorted(added))
+        if starting:
+            self.ready.emit()
+        return added, removed
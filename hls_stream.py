@@ -0,0 +1,194 @@
+import os
+import math
+import shutil
+import hashlib
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from ffmpeg_jobs import FfmpegJob
+
+
+class HlsStream(QObject):
+    # Growing HLS event playlist made of short MPEG-TS segments. Each clip is segmented
+    # once, with its timestamps shifted to where it starts in the stream, and appended to
+    # live.m3u8 as soon as it is done, so playback can start after the first clip and new
+    # clips extend the stream in place. Once every clip has been segmented the playlist
+    # is ended with #EXT-X-ENDLIST: players only reach the end of, and can only seek in,
+    # a playlist that has ended.
+    segmentsAdded = pyqtSignal()
+    streamReset = pyqtSignal()
+
+    def __init__(self, stream_dir, runner, segment_seconds=4, parent=None):
+        super().__init__(parent)
+        self.stream_dir = stream_dir
+        self.runner = runner
+        self.segment_seconds = segment_seconds
+        self.entries = []  # Published clips: {"key", "name", "duration", "segments"}
+        self.queued = []  # Clips being segmented, in stream order
+        self.failed = set()
+        self.last_inputs = []
+        self.generation = 0
+        self.reset_directory()
+
+    def playlist_path(self):
+        return os.path.join(self.stream_dir, "live.m3u8")
+
+    def is_ready(self):
+        return bool(self.entries)
+
+    def clip_key(self, name, input_path):
+        stat = os.stat(input_path)
+        size, mtime = stat.st_size, stat.st_mtime_ns
+        return hashlib.blake2b(f"{name}|{input_path}|{size}|{mtime}".encode(), digest_size=12).hexdigest()
+
+    def reset_directory(self):
+        shutil.rmtree(self.stream_dir, ignore_errors=True)
+        os.makedirs(self.stream_dir, exist_ok=True)
+
+    def update(self, inputs):
+        # inputs: (name, input path, duration in ms) of every clip that should be streamed
+        self.last_inputs = inputs
+        wanted = {}
+        for name, input_path, duration in inputs:
+            try:
+                wanted[self.clip_key(name, input_path)] = (name, input_path, duration)
+            except OSError:
+                continue
+        streamed = [entry["key"] for entry in self.entries] + [entry["key"] for entry in self.queued]
+        if any(key not in wanted for key in streamed):
+            # A clip was removed or changed; segments already on disk carry timestamps
+            # that no longer line up, so start a fresh stream
+            self.reset()
+            streamed = []
+        streamed = set(streamed)
+        for key, (name, input_path, duration) in wanted.items():
+            if key not in streamed and key not in self.failed:
+                self.enqueue(key, name, input_path, duration)
+
+    def reset(self):
+        # Let the player let go of the old segments before they are deleted
+        self.streamReset.emit()
+        self.generation += 1
+        for entry in self.queued:
+            entry["job"].cancel()
+        self.entries = []
+        self.queued = []
+        self.reset_directory()
+
+    def stream_duration(self):
+        return sum(entry["duration"] for entry in self.entries + self.queued)
+
+    def enqueue(self, key, name, input_path, duration):
+        # New clips always go at the end, so the published part of the stream never changes
+        offset = self.stream_duration() / 1000
+        clip_playlist = os.path.join(self.stream_dir, f"{key}.m3u8")
+        command = [
+            "ffmpeg",
+            "-y",
+            "-v",
+            "error",
+            "-i",
+            input_path,
+            "-map",
+            "0:v:0",
+            "-map",
+            "0:a:0?",
+            "-c",
+            "copy",
+            "-output_ts_offset",
+            f"{offset:.3f}",
+            "-f",
+            "hls",
+            "-hls_time",
+            str(self.segment_seconds),
+            "-hls_list_size",
+            "0",
+            "-hls_playlist_type",
+            "vod",
+            "-hls_segment_filename",
+            os.path.join(self.stream_dir, f"{key}_%05d.ts"),
+            clip_playlist,
+        ]
+        job = FfmpegJob(command)
+        entry = {
+            "key": key,
+            "name": name,
+            "input_path": input_path,
+            "duration": duration,
+            "segments": [],
+            "job": job,
+            "done": False,
+        }
+        generation = self.generation
+        job.finished.connect(lambda job: self.segment_finished(entry, clip_playlist, generation))
+        self.queued.append(entry)
+        self.runner.submit(job)
+
+    def segment_finished(self, entry, clip_playlist, generation):
+        if generation != self.generation or entry not in self.queued:
+            return
+        job = entry["job"]
+        if not job.succeeded():
+            print(f"Warning: could not segment {entry['name']}")
+            self.failed.add(entry["key"])
+            # The published clips come before it and keep their offsets; only the clips
+            # queued after it were offset assuming it would be there
+            index = self.queued.index(entry)
+            later = self.queued[index + 1:]
+            del self.queued[index:]
+            for queued in later:
+                queued["job"].cancel()
+            for queued in later:
+                self.enqueue(queued["key"], queued["name"], queued["input_path"], queued["duration"])
+            if not self.queued and self.entries:
+                self.write_playlist()  # End the playlist without the failed clip
+            return
+        entry["segments"] = self.read_segments(clip_playlist)
+        entry["done"] = True
+        # Publish in stream order only; later clips wait for earlier ones
+        while self.queued and self.queued[0]["done"]:
+            published = self.queued.pop(0)
+            del published["job"]
+            self.entries.append(published)
+        self.write_playlist()
+        self.segmentsAdded.emit()
+
+    def read_segments(self, clip_playlist):
+        segments = []
+        duration = None
+        with open(clip_playlist, "r") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("#EXTINF:"):
+                    duration = float(line[len("#EXTINF:"):].rstrip(",").split(",")[0])
+                elif line and not line.startswith("#") and duration is not None:
+                    segments.append((line, duration))
+                    duration = None
+        return segments
+
+    def write_playlist(self):
+        segments = [segment for entry in self.entries for segment in entry["segments"]]
+        target_duration = max([math.ceil(duration) for _, duration in segments] + [self.segment_seconds])
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-PLAYLIST-TYPE:EVENT",
+            f"#EXT-X-TARGETDURATION:{target_duration}",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for uri, duration in segments:
+            lines.append(f"#EXTINF:{duration:.6f},")
+            lines.append(uri)
+        if not self.queued:
+            # Clips added later reopen the event; the player picks that up when it reloads
+            lines.append("#EXT-X-ENDLIST")
+        # Write atomically so the player never reads a half-written playlist
+        temp_path = self.playlist_path() + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, self.playlist_path())
+
+    def timeline(self):
+        cumulative_durations = [0]
+        for entry in self.entries:
+            cumulative_durations.append(cumulative_durations[-1] + entry["duration"])
+        return {"cumulative_durations": cumulative_durations, "total_time": cumulative_durations[-1]}
@@ -0,0 +1,181 @@
+import os
+import json
+import hashlib
+import sqlite3
+import subprocess
+
+
+METADATA_FIELDS = (
+    "duration",
+    "fps",
+    "width",
+    "height",
+    "codec",
+    "pix_fmt",
+    "audio_codec",
+    "sample_rate",
+    "channels",
+)
+COLUMN_TYPES = {
+    "duration": "REAL",
+    "fps": "REAL",
+    "width": "INTEGER",
+    "height": "INTEGER",
+    "sample_rate": "INTEGER",
+    "channels": "INTEGER",
+}
+
+
+def file_signature(video_path):
+    # (size, mtime) identifies a version of a file without reading its contents
+    stat = os.stat(video_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def partial_content_hash(video_path, block_size=1 << 20):
+    # Fast content identity: size plus the first and last block of the file, so it
+    # survives renames and copies without reading multi-GB clips in full
+    digest = hashlib.blake2b(digest_size=16)
+    with open(video_path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        digest.update(str(size).encode())
+        digest.update(f.read(block_size))
+        if size > block_size:
+            f.seek(max(block_size, size - block_size))
+            digest.update(f.read(block_size))
+    return digest.hexdigest()
+
+
+def probe_command(video_path):
+    return [
+        "ffprobe",
+        "-v",
+        "error",
+        "-show_entries",
+        "format=duration:stream=codec_type,codec_name,width,height,r_frame_rate,pix_fmt,sample_rate,channels",
+        "-of",
+        "json",
+        video_path,
+    ]
+
+
+def parse_frame_rate(rate):
+    # ffprobe reports frame rates as fractions, e.g. "30000/1001"
+    if not rate or rate == "0/0":
+        return 0.0
+    numerator, _, denominator = rate.partition("/")
+    if not denominator:
+        return float(numerator)
+    return float(numerator) / float(denominator) if float(denominator) else 0.0
+
+
+def parse_probe_output(output):
+    # Returns None when ffprobe could not read the file (e.g. it is still being written)
+    try:
+        data = json.loads(output)
+        duration = float(data["format"]["duration"])
+    except (ValueError, KeyError, TypeError):
+        return None
+    info = dict.fromkeys(METADATA_FIELDS)
+    info["duration"] = duration
+    for stream in data.get("streams", []):
+        if stream.get("codec_type") == "video" and info["codec"] is None:
+            info["codec"] = stream.get("codec_name")
+            info["width"] = stream.get("width", 0)
+            info["height"] = stream.get("height", 0)
+            info["fps"] = parse_frame_rate(stream.get("r_frame_rate"))
+            info["pix_fmt"] = stream.get("pix_fmt")
+        elif stream.get("codec_type") == "audio" and info["audio_codec"] is None:
+            info["audio_codec"] = stream.get("codec_name")
+            info["sample_rate"] = int(stream.get("sample_rate") or 0)
+            info["channels"] = stream.get("channels", 0)
+    return info
+
+
+def probe_video(video_path):
+    result = subprocess.run(
+        probe_command(video_path), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+    )
+    if result.returncode != 0:
+        return None
+    return parse_probe_output(result.stdout)
+
+
+class MetadataCache:
+    # On-disk cache of ffprobe results keyed by (path, size, mtime), so a rescan
+    # only probes files that are new or have changed since they were last seen
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(metadata)")]
+        if columns and columns[3:] != list(METADATA_FIELDS):
+            # Written by an older version with different fields; it is only a cache
+            self.connection.execute("DROP TABLE metadata")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS metadata (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, "
+            + ", ".join(f"{field} {COLUMN_TYPES.get(field, 'TEXT')}" for field in METADATA_FIELDS)
+            + ")"
+        )
+        self.connection.commit()
+
+        # Keep every row in memory; a cached reload is then just a dict lookup per clip
+        self.entries = {}
+        for row in self.connection.execute(
+            "SELECT path, size, mtime, " + ", ".join(METADATA_FIELDS) + " FROM metadata"
+        ):
+            self.entries[row[0]] = ((row[1], row[2]), dict(zip(METADATA_FIELDS, row[3:])))
+
+    def lookup(self, video_path, signature=None):
+        entry = self.entries.get(video_path)
+        if entry is None:
+            return None
+        if signature is None:
+            try:
+                signature = file_signature(video_path)
+            except OSError:
+                return None
+        cached_signature, info = entry
+        if cached_signature != signature:
+            return None
+        return info
+
+    def store(self, video_path, info, signature=None):
+        if signature is None:
+            signature = file_signature(video_path)
+        self.entries[video_path] = (signature, info)
+        self.connection.execute(
+            "INSERT OR REPLACE INTO metadata VALUES (?, ?, ?, " + ", ".join("?" * len(METADATA_FIELDS)) + ")",
+            (video_path, signature[0], signature[1]) + tuple(info[field] for field in METADATA_FIELDS),
+        )
+        self.connection.commit()
+
+    def get(self, video_path):
+        try:
+            signature = file_signature(video_path)
+        except OSError:
+            return None
+        info = self.lookup(video_path, signature)
+        if info is None:
+            info = probe_video(video_path)
+            if info is not None:
+                self.store(video_path, info, signature)
+        return info
+
+    def prune(self, keep_paths, prefix=""):
+        # Drop entries under prefix that are no longer part of the folder
+        stale = [
+            path for path in self.entries
+            if path.startswith(prefix) and path not in keep_paths
+        ]
+        for path in stale:
+            del self.entries[path]
+        if stale:
+            self.connection.executemany(
+                "DELETE FROM metadata WHERE path = ?", [(path,) for path in stale]
+            )
+            self.connection.commit()
+
+    def close(self):
+        self.connection.close()
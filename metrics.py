@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+from PyQt6.QtCore import QTimer
+
+# Timings and counters for the players, written every few seconds to a JSON file or a
+# Prometheus textfile (for node_exporter's textfile collector). Disabled by default:
+# every call then returns after a single attribute check, and the per-frame hooks in
+# the players are only connected when metrics are enabled.
+
+SAMPLE_SIZE = 1024  # Recent samples kept per timing, for the quantiles
+QUANTILES = (0.5, 0.9, 0.99)
+PROMETHEUS_PREFIX = "video_tools_"
+SEEK_TOLERANCE_MS = 500
+
+
+class Timing:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def quantiles(self):
+        samples = sorted(self.samples)
+        if not samples:
+            return {q: 0.0 for q in QUANTILES}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in QUANTILES}
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.app = None
+        self.timer = None
+        # Timings and counters can be recorded from worker threads (moves, scans)
+        self.lock = threading.Lock()
+        self.timings = {}  # (name, labels) -> Timing
+        self.counters = {}  # (name, labels) -> total
+        self.gauges = {}  # (name, labels) -> value
+        self.started = {}  # (name, key) -> (start time, labels); GUI thread only
+
+    def enable(self, path, app, interval=10.0):
+        # path ending in .json writes JSON, anything else the Prometheus text format
+        self.enabled = True
+        self.path = path
+        self.app = app
+        self.timer = QTimer()
+        self.timer.setInterval(int(interval * 1000))
+        self.timer.timeout.connect(self.write)
+        self.timer.start()
+
+    def start(self, name, key=None, **labels):
+        # Starts a timing that stop() records; starting it again restarts it
+        if self.enabled:
+            self.started[(name, key)] = (time.monotonic(), labels)
+
+    def is_started(self, name, key=None):
+        return self.enabled and (name, key) in self.started
+
+    def stop(self, name, key=None, **labels):
+        if not self.enabled:
+            return None
+        entry = self.started.pop((name, key), None)
+        if entry is None:
+            return None
+        started, start_labels = entry
+        elapsed = time.monotonic() - started
+        self.observe(name, elapsed, **start_labels, **labels)
+        return elapsed
+
+    def cancel(self, name, key=None):
+        if self.enabled:
+            self.started.pop((name, key), None)
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            timing = self.timings.get(key)
+            if timing is None:
+                timing = self.timings[key] = Timing()
+            timing.add(seconds)
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def snapshot(self):
+        with self.lock:
+            timings = [
+                (name, dict(labels), timing.count, timing.sum, timing.max, timing.quantiles())
+                for (name, labels), timing in self.timings.items()
+            ]
+            counters = [(name, dict(labels), value) for (name, labels), value in self.counters.items()]
+            gauges = [(name, dict(labels), value) for (name, labels), value in self.gauges.items()]
+        return timings, counters, gauges
+
+    def format_json(self):
+        timings, counters, gauges = self.snapshot()
+        return json.dumps({
+            "app": self.app,
+            "updated": time.time(),
+            "timings": [
+                {
+                    "name": name, "labels": labels, "count": count, "sum": total, "max": maximum,
+                    **{f"p{round(q * 100)}": value for q, value in quantiles.items()},
+                }
+                for name, labels, count, total, maximum, quantiles in timings
+            ],
+            "counters": [{"name": name, "labels": labels, "value": value} for name, labels, value in counters],
+            "gauges": [{"name": name, "labels": labels, "value": value} for name, labels, value in gauges],
+        }, indent=2)
+
+    def format_prometheus(self):
+        timings, counters, gauges = self.snapshot()
+        lines = []
+        declared = set()
+
+        def declare(name, kind):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f"# TYPE {name} {kind}")
+
+        def sample(name, labels, value):
+            labels = {"app": self.app, **labels}
+            label_text = ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value:.6g}")
+
+        for name, labels, count, total, _, quantiles in sorted(timings, key=lambda t: t[0]):
+            name = PROMETHEUS_PREFIX + name
+            declare(name, "summary")
+            for q, value in quantiles.items():
+                sample(name, {**labels, "quantile": str(q)}, value)
+            sample(name + "_sum", labels, total)
+            sample(name + "_count", labels, count)
+        for kind, series in (("counter", counters), ("gauge", gauges)):
+            for name, labels, value in sorted(series, key=lambda s: s[0]):
+                name = PROMETHEUS_PREFIX + name
+                declare(name, kind)
+                sample(name, labels, value)
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        if not self.enabled:
+            return
+        text = self.format_json() if self.path.endswith(".json") else self.format_prometheus()
+        # Readers must never see a half-written file
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, "w") as f:
+                f.write(text)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"Warning: could not write metrics to {self.path}: {e}")
+
+    def close(self):
+        if self.enabled:
+            self.timer.stop()
+            self.write()
+
+
+def frame_near(frame, position):
+    # Whether a QVideoFrame is (close to) the one a seek to position (ms) asked for;
+    # frames decoded before the seek can still arrive after it
+    start_time = frame.startTime()
+    return start_time < 0 or abs(start_time / 1000 - position) <= SEEK_TOLERANCE_MS
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+# Shared by everything in the process, like QThreadPool.globalInstance()
+metrics = Metrics()
@@ -0,0 +1,107 @@
+import os
+import shutil
+import time
+from collections import deque
+from PyQt6.QtCore import QCoreApplication, QObject, QRunnable, QThreadPool, pyqtSignal
+
+from metrics import metrics
+
+VIDEO_EXTENSIONS = ['.mp4', '.avi', '.mov', '.mkv']
+
+
+def rating_folder(rating, root=None):
+    return os.path.join(root or os.getcwd(), str(rating))
+
+
+def rating_destination(video_path, rating, root=None):
+    return os.path.join(rating_folder(rating, root), os.path.basename(video_path))
+
+
+def move_to_rating_folder(video_path, rating, root=None):
+    # Move a clip into the folder for its rating; returns the new path
+    dest_path = rating_destination(video_path, rating, root)
+    move_file(video_path, dest_path)
+    return dest_path
+
+
+def move_file(source, dest):
+    # Never overwrite, so a name clash between two source folders cannot lose a clip
+    if os.path.exists(dest):
+        raise FileExistsError(f"{dest} already exists")
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    shutil.move(source, dest)
+
+
+class MoveSignals(QObject):
+    finished = pyqtSignal(object, str)  # The task, error message ("" on success)
+
+
+class MoveTask(QRunnable):
+    def __init__(self, key, source, dest):
+        super().__init__()
+        self.key = key
+        self.source = source
+        self.dest = dest
+        self.signals = MoveSignals()
+        # The queue keeps the task alive until its result has been handled
+        self.setAutoDelete(False)
+
+    def run(self):
+        started = time.monotonic()
+        try:
+            move_file(self.source, self.dest)
+        except Exception as e:
+            metrics.observe("file_move_seconds", time.monotonic() - started, status="failed")
+            self.signals.finished.emit(self, str(e))
+        else:
+            metrics.observe("file_move_seconds", time.monotonic() - started, status="ok")
+            self.signals.finished.emit(self, "")
+
+
+class MoveQueue(QObject):
+    # Moves files on a thread pool, so a copy across volumes never blocks the GUI.
+    # Moves that share a key (e.g. the same clip rated twice, or a rating and its undo)
+    # run one after the other, in the order they were submitted.
+    moveFinished = pyqtSignal(object, object, str, str, str)  # key, tag, source, dest, error
+
+    def __init__(self, max_workers=2, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(max_workers)
+        self.waiting = {}  # key -> deque of (task, tag) submitted while another move for key runs
+        self.running = {}  # key -> (task, tag)
+
+    def submit(self, key, source, dest, tag=None):
+        task = MoveTask(key, source, dest)
+        if key in self.running:
+            self.waiting.setdefault(key, deque()).append((task, tag))
+        else:
+            self.start(task, tag)
+
+    def start(self, task, tag):
+        self.running[task.key] = (task, tag)
+        task.signals.finished.connect(self.task_finished)
+        self.pool.start(task)
+
+    def task_finished(self, task, error):
+        _, tag = self.running.pop(task.key)
+        waiting = self.waiting.get(task.key)
+        if waiting:
+            self.start(*waiting.popleft())
+            if not waiting:
+                del self.waiting[task.key]
+        self.moveFinished.emit(task.key, tag, task.source, task.dest, error)
+
+    def is_busy(self, key=None):
+        if key is None:
+            return bool(self.running)
+        return key in self.running
+
+    def pending_count(self):
+        return len(self.running) + sum(len(waiting) for waiting in self.waiting.values())
+
+    def wait(self):
+        # Let every queued move finish and deliver its result, e.g. before quitting
+        while self.pending_count():
+            self.pool.waitForDone(50)
+            QCoreApplication.processEvents()
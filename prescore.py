@@ -0,0 +1,193 @@
+import os
+import math
+import sqlite3
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from metadata_cache import file_signature
+
+# Cheap per-clip metrics computed from small grayscale frames, used to bring the clips
+# most worth watching to the front of the ranking queue
+METRIC_FIELDS = (
+    "score",
+    "black_ratio",  # Fraction of frames that are (nearly) black
+    "frozen_ratio",  # Fraction of frame pairs with (nearly) no change
+    "motion",  # Mean absolute luma change between frames, 0 - 255
+    "sharpness",  # Mean variance of the Laplacian
+    "scene_cuts",  # Number of abrupt changes between frames
+)
+
+ANALYSIS_WIDTH = 64
+ANALYSIS_HEIGHT = 36
+ANALYSIS_FPS = 2
+BLACK_LUMA = 20
+FROZEN_DIFF = 0.5
+CUT_DIFF = 40
+SHARPNESS_REFERENCE = 500.0
+
+
+def analysis_command(video_path):
+    return [
+        "ffmpeg",
+        "-v",
+        "error",
+        "-threads",
+        "1",
+        "-i",
+        video_path,
+        "-an",
+        "-vf",
+        f"fps={ANALYSIS_FPS},scale={ANALYSIS_WIDTH}:{ANALYSIS_HEIGHT}",
+        "-pix_fmt",
+        "gray",
+        "-f",
+        "rawvideo",
+        "-",
+    ]
+
+
+def compute_metrics(frames):
+    # frames: uint8 array of shape (count, height, width)
+    frames = frames.astype(np.float32)
+    means = frames.mean(axis=(1, 2))
+    black_ratio = float((means < BLACK_LUMA).mean())
+    if len(frames) > 1:
+        diffs = np.abs(np.diff(frames, axis=0)).mean(axis=(1, 2))
+        frozen_ratio = float((diffs < FROZEN_DIFF).mean())
+        motion = float(diffs.mean())
+        scene_cuts = int((diffs > CUT_DIFF).sum())
+    else:
+        # A single frame (a clip under 1 / ANALYSIS_FPS seconds) says nothing about
+        # freezing; it must not be scored or hidden as frozen
+        frozen_ratio, motion, scene_cuts = 0.0, 0.0, 0
+    laplacian = (
+        4 * frames[:, 1:-1, 1:-1]
+        - frames[:, :-2, 1:-1]
+        - frames[:, 2:, 1:-1]
+        - frames[:, 1:-1, :-2]
+        - frames[:, 1:-1, 2:]
+    )
+    sharpness = float(laplacian.var(axis=(1, 2)).mean())
+    # Higher is more worth watching: penalise black and frozen footage and blur
+    score = (1 - black_ratio) * (1 - frozen_ratio) * min(1.0, sharpness / SHARPNESS_REFERENCE)
+    return {
+        "score": score,
+        "black_ratio": black_ratio,
+        "frozen_ratio": frozen_ratio,
+        "motion": motion,
+        "sharpness": sharpness,
+        "scene_cuts": scene_cuts,
+    }
+
+
+def analyze_clip(video_path, known_signature=None):
+    # Runs in a worker process. Returns (signature, metrics), with metrics None when the
+    # clip is unchanged since known_signature or could not be decoded.
+    signature = file_signature(video_path)
+    if signature == known_signature:
+        return signature, None
+    result = subprocess.run(analysis_command(video_path), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    frame_size = ANALYSIS_WIDTH * ANALYSIS_HEIGHT
+    count = len(result.stdout) // frame_size
+    if result.returncode != 0 or count == 0:
+        return signature, None
+    frames = np.frombuffer(result.stdout, dtype=np.uint8, count=count * frame_size)
+    return signature, compute_metrics(frames.reshape(count, ANALYSIS_HEIGHT, ANALYSIS_WIDTH))
+
+
+class PrescoreCache:
+    # Metrics per (path, size, mtime), in the same layout as MetadataCache
+    def __init__(self, db_path):
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(prescores)")]
+        if columns and columns[3:] != list(METRIC_FIELDS):
+            # Written by a version with different metrics; they are only a cache
+            self.connection.execute("DROP TABLE prescores")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS prescores (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, "
+            + ", ".join(f"{field} REAL" for field in METRIC_FIELDS)
+            + ")"
+        )
+        self.connection.commit()
+        self.entries = {}
+        for row in self.connection.execute(
+            "SELECT path, size, mtime, " + ", ".join(METRIC_FIELDS) + " FROM prescores"
+        ):
+            self.entries[row[0]] = ((row[1], row[2]), dict(zip(METRIC_FIELDS, row[3:])))
+
+    def store(self, video_path, signature, metrics):
+        self.entries[video_path] = (signature, metrics)
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO prescores VALUES (?, ?, ?, " + ", ".join("?" * len(METRIC_FIELDS)) + ")",
+                (video_path, signature[0], signature[1]) + tuple(metrics[field] for field in METRIC_FIELDS),
+            )
+
+    def close(self):
+        self.connection.close()
+
+
+class Prescorer(QObject):
+    # Scores clips in a process pool, so the NumPy work runs on every core without
+    # holding the GUI thread's GIL. Cached metrics are only re-used after the worker
+    # has confirmed that the file has not changed.
+    scored = pyqtSignal(str, dict)  # Video path, metrics
+    analysisDone = pyqtSignal(str, object)  # Internal: video path, future
+
+    def __init__(self, db_path, max_workers=None, parent=None):
+        super().__init__(parent)
+        self.cache = PrescoreCache(db_path)
+        # Spawned workers do not inherit the GUI process's Qt state
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers or max(1, (os.cpu_count() or 2) // 2),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        self.pending = set()
+        self.analysisDone.connect(self.analysis_done)
+
+    def request(self, paths):
+        for video_path in paths:
+            if video_path in self.pending:
+                continue
+            self.pending.add(video_path)
+            entry = self.cache.entries.get(video_path)
+            future = self.executor.submit(analyze_clip, video_path, entry[0] if entry else None)
+            # Done callbacks run on an executor thread; the signal hands over to the GUI thread
+            future.add_done_callback(lambda future, video_path=video_path: self.analysisDone.emit(video_path, future))
+
+    def analysis_done(self, video_path, future):
+        self.pending.discard(video_path)
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            print(f"Warning: could not analyze {video_path}: {future.exception()}")
+            return
+        signature, metrics = future.result()
+        if metrics is None:
+            entry = self.cache.entries.get(video_path)
+            if entry is None or entry[0] != signature:
+                print(f"Warning: could not analyze {video_path}")
+                return
+            metrics = entry[1]
+        else:
+            self.cache.store(video_path, signature, metrics)
+        self.scored.emit(video_path, metrics)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.cache.close()
+
+
+def format_metrics(metrics):
+    if metrics is None or math.isnan(metrics["score"]):
+        return ""
+    return (
+        f"score {metrics['score']:.2f}, black {metrics['black_ratio']:.0%}, "
+        f"frozen {metrics['frozen_ratio']:.0%}, motion {metrics['motion']:.1f}, "
+        f"sharpness {metrics['sharpness']:.0f}, cuts {int(metrics['scene_cuts'])}"
+    )
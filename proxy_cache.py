@@ -0,0 +1,78 @@
+from thumbnail_cache import ThumbnailCache, ThumbnailLoader
+
+PROXY_HEIGHT = 540
+# Sources at or below this height in one of these codecs decode fine as they are
+LIGHT_MAX_HEIGHT = 1080
+LIGHT_CODECS = ("h264", "mpeg4", "mpeg2video", "mjpeg", "vp8")
+
+
+def is_heavy(info, max_height=LIGHT_MAX_HEIGHT):
+    # e.g. 4K of any codec, or HEVC / ProRes / DNxHD at any size
+    return (info.get("height") or 0) > max_height or info.get("codec") not in LIGHT_CODECS
+
+
+def proxy_command(source_path, output_path, info, height=PROXY_HEIGHT):
+    # A light H.264 copy for review: at most `height` lines, a keyframe every second so
+    # seeks stay cheap, and the moov atom up front so playback can start right away
+    command = ["ffmpeg", "-y", "-v", "error", "-i", source_path, "-map", "0:v:0"]
+    if info.get("audio_codec") is not None:
+        command += ["-map", "0:a:0", "-c:a", "aac", "-b:a", "128k"]
+    else:
+        command += ["-an"]
+    command += [
+        "-vf",
+        f"scale=-2:'min({height},ih)',format=yuv420p",
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-crf",
+        "23",
+        "-force_key_frames",
+        "expr:gte(t,n_forced*1)",
+        "-movflags",
+        "+faststart",
+        output_path,
+    ]
+    return command
+
+
+def proxy_profile(profile, height=PROXY_HEIGHT):
+    # The concat target profile scaled down to proxy size, for players that build one
+    # concatenated video: every clip above it is then normalized to a light H.264 copy
+    if profile is None or ((profile["height"] or 0) <= height and profile["codec"] == "h264"):
+        return profile
+    proxy = dict(profile)
+    if (profile["height"] or 0) > height:
+        proxy["width"] = round(profile["width"] * height / profile["height"] / 2) * 2
+        proxy["height"] = height
+    proxy["codec"] = "h264"
+    proxy["pix_fmt"] = "yuv420p"
+    return proxy
+
+
+class ProxyCache(ThumbnailCache):
+    # Proxies addressed by (path, size, mtime) like the list strips
+    suffix = ".mp4"
+
+
+class ProxyLoader(ThumbnailLoader):
+    # Transcodes proxies of heavy clips on a JobRunner and announces them with
+    # thumbnailReady; light clips are left out and play as they are
+    kind = "proxy"
+
+    def __init__(self, cache, metadata_cache, runner, height=PROXY_HEIGHT, heavy_only=True, max_queued=16,
+                 parent=None):
+        super().__init__(cache, metadata_cache, runner, max_queued=max_queued, parent=parent)
+        self.proxy_height = height
+        self.heavy_only = heavy_only
+
+    def wants(self, info):
+        return not self.heavy_only or is_heavy(info)
+
+    def build_command(self, video_path, output_path, info):
+        return proxy_command(video_path, output_path, info, self.proxy_height)
+
+    def playback_path(self, video_path):
+        # The proxy when there is one, otherwise the original; a missing proxy is queued
+        return self.request(video_path) or video_path
@@ -1,31 +1,158 @@
 import sys
 import os
-import json
-import shutil
+import argparse
+from collections import deque
 from PyQt6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-    QPushButton, QListWidget, QListWidgetItem, QAbstractItemView,
-    QCheckBox, QSlider, QStyle
+    QPushButton, QListView, QAbstractItemView,
+    QCheckBox, QSlider, QStyle, QProgressBar, QLabel, QStackedLayout, QComboBox
 )
-from PyQt6.QtCore import Qt, QUrl, QEvent
-from PyQt6.QtGui import QDragEnterEvent, QDropEvent, QKeyEvent
+from PyQt6.QtCore import Qt, QUrl, QEvent, QSize, QPoint, QTimer
+from PyQt6.QtGui import QDragEnterEvent, QDropEvent, QKeyEvent, QKeySequence, QShortcut
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
 from PyQt6.QtMultimediaWidgets import QVideoWidget
 
+from ratings_store import open_ratings_store, DEFAULT_STORE, LEGACY_JSON_FILE
+from move_queue import MoveQueue, rating_destination, VIDEO_EXTENSIONS
+from folder_scan import FolderScanThread
+from video_list_model import (
+    VideoListModel, VideoSortFilterModel, MOVE_PENDING, MOVE_DONE, MOVE_FAILED, IDENTITY_NEW, IDENTITY_KNOWN, IDENTITY_DUPLICATE
+)
+from content_index import ContentIndex
+from prescore import Prescorer, METRIC_FIELDS, format_metrics
+import ranker_batch
+from metadata_cache import MetadataCache
+from ffmpeg_jobs import JobRunner
+from thumbnail_cache import ThumbnailCache, ThumbnailLoader
+from scrub_preview import SpriteLoader, SpriteSheet
+from proxy_cache import ProxyCache, ProxyLoader
+from metrics import metrics, frame_near
+
+METADATA_CACHE_NAME = '.video_metadata.db'
+THUMBNAIL_CACHE_NAME = '.thumbnails'
+THUMBNAIL_SIZE = QSize(256, 36)  # Strip of four 16:9 keyframes
+PRESCORE_CACHE_NAME = '.prescores.db'
+SCRUB_CACHE_NAME = '.scrub_sprites'
+PROXY_CACHE_NAME = '.proxies'
+PROXY_LOOKAHEAD = 3  # Clips ahead in the queue to build proxies for
+REFRESH_INTERVAL_MS = 2000  # How often a shared store is polled for other reviewers' changes
+CLAIM_RENEW_MS = 60000  # Well within ratings_store.LEASE_SECONDS
+
+# Queue orders: label -> (metric, descending); None keeps the drop order
+QUEUE_ORDERS = {
+    'Drop order': (None, False),
+    'Best score': ('score', True),
+    'Most motion': ('motion', True),
+    'Sharpest': ('sharpness', True),
+    'Most scene cuts': ('scene_cuts', True),
+    'Least black': ('black_ratio', False),
+}
+# Clips above these are hidden by "Hide black/frozen"
+UNUSABLE_THRESHOLDS = {'black_ratio': 0.9, 'frozen_ratio': 0.9}
+
 class VideoRanker(QMainWindow):
-    def __init__(self):
+    def __init__(self, store_path=DEFAULT_STORE, undo_depth=50, thumbnails=True,
+                 thumbnail_cache_bytes=512 << 20, prefetch=True, prefetch_previous=False, prescore=False,
+                 scrub_previews=True, scrub_cache_bytes=1024 << 20, proxies=False, proxy_workers=1,
+                 proxy_cache_bytes=20 << 30, reviewer=None):
         super().__init__()
 
-        self.setWindowTitle("Video Ranker")
+        self.setWindowTitle("Video Ranker" if reviewer is None else f"Video Ranker - {reviewer}")
         self.resize(800, 600)
 
-        self.processed_videos = {}
-        self.json_file = 'processed_videos.json'
-        self.load_json()
-
-        self.video_list = []
+        # Ratings are committed one change at a time; an existing processed_videos.json
+        # is imported the first time the store is created
+        self.ratings_store = open_ratings_store(store_path, legacy_json=LEGACY_JSON_FILE, reviewer=reviewer)
+        self.processed_videos = self.ratings_store.ratings
+
+        # With a reviewer name the store is shared: the clip on screen is claimed so no one
+        # else gets it, the queue skips clips others have rated or claimed, and their
+        # ratings and moves show up in the list as they happen
+        self.shared = reviewer is not None
+        self.claimed_path = None
+        if self.shared:
+            self.refresh_timer = QTimer(self)
+            self.refresh_timer.setInterval(REFRESH_INTERVAL_MS)
+            self.refresh_timer.timeout.connect(self.refresh_from_store)
+            self.refresh_timer.start()
+            self.claim_timer = QTimer(self)
+            self.claim_timer.setInterval(CLAIM_RENEW_MS)
+            self.claim_timer.timeout.connect(self.renew_claim)
+            self.claim_timer.start()
+
+        # Paths, shown ratings and move states of every clip in the list
+        self.video_model = VideoListModel(parent=self)
+        # The order clips are shown and queued in; rows are mapped back to video_model
+        self.sort_model = VideoSortFilterModel(parent=self)
+        self.sort_model.setSourceModel(self.video_model)
+
+        # Optional NumPy pre-scoring of new clips, to sort and filter the queue
+        self.prescorer = None
+        if prescore:
+            self.prescorer = Prescorer(PRESCORE_CACHE_NAME, parent=self)
+            self.prescorer.scored.connect(self.clip_scored)
+            self.video_model.set_metric_fields(METRIC_FIELDS, format_metrics)
+
+        # Content hashes, so clips rated under another path or listed twice are recognised
+        self.content_index = ContentIndex(METADATA_CACHE_NAME, parent=self)
+        self.content_index.hashed.connect(self.clips_hashed)
+        self.hash_rows = {}  # content hash -> first row with that content
+
+        # Keyframe strips for the list, built in the background as rows are shown
+        self.metadata_cache = MetadataCache(METADATA_CACHE_NAME)
+        self.thumbnail_runner = JobRunner(max_concurrent=2, name="thumbnails", parent=self)
+        self.thumbnail_loader = None
+        if thumbnails:
+            self.thumbnail_loader = ThumbnailLoader(
+                ThumbnailCache(THUMBNAIL_CACHE_NAME, thumbnail_cache_bytes),
+                self.metadata_cache,
+                self.thumbnail_runner,
+                height=THUMBNAIL_SIZE.height(),
+                parent=self,
+            )
+            self.video_model.set_thumbnail_loader(self.thumbnail_loader, THUMBNAIL_SIZE)
+
+        # Sprite sheets for scrubbing: while the slider is dragged the nearest frame is
+        # shown from memory, and the player only seeks once, when the slider is released
+        self.sprite_runner = JobRunner(max_concurrent=1, name="sprites", parent=self)
+        self.sprite_loader = None
+        self.sprite_sheet = None  # SpriteSheet of the clip on screen, once it is built
+        if scrub_previews:
+            self.sprite_loader = SpriteLoader(
+                ThumbnailCache(SCRUB_CACHE_NAME, scrub_cache_bytes),
+                self.metadata_cache,
+                self.sprite_runner,
+                parent=self,
+            )
+            self.sprite_loader.thumbnailReady.connect(self.sprite_ready)
+
+        # Optional low-res proxies of heavy clips (4K, HEVC, ProRes, ...). Only playback
+        # uses them; the list, ratings and moves always work on the original paths.
+        self.proxy_runner = JobRunner(max_concurrent=proxy_workers, name="proxies", parent=self)
+        self.proxy_loader = None
+        if proxies:
+            self.proxy_loader = ProxyLoader(
+                ProxyCache(PROXY_CACHE_NAME, proxy_cache_bytes),
+                self.metadata_cache,
+                self.proxy_runner,
+                parent=self,
+            )
         self.current_index = -1
         self.awaiting_media_load = False  # New flag to track media loading
+        self.seek_target = 0  # Position of the last seek, for its latency metric
+        self.prefetch_next = prefetch
+        self.prefetch_previous = prefetch_previous
+
+        # Files are moved in the background; the list shows each clip's move state
+        # and the rating it will have once its moves are done
+        self.move_queue = MoveQueue()
+        self.move_queue.moveFinished.connect(self.move_finished)
+        self.target_paths = {}  # index -> path the clip will have after its queued moves
+        self.undo_stack = deque(maxlen=undo_depth)
+
+        # Dropped folders are scanned one at a time on a background thread
+        self.scan_thread = None
+        self.scan_queue = deque()
 
         self.create_ui()
 
@@ -41,12 +168,34 @@ class VideoRanker(QMainWindow):
         self.setCentralWidget(main_widget)
 
         # Left side: video list
-        self.list_widget = QListWidget()
-        self.list_widget.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
-        self.list_widget.itemDoubleClicked.connect(self.play_selected_video)
-        self.list_widget.itemSelectionChanged.connect(self.on_item_selection_changed)  # Connect selection change
-        self.list_widget.installEventFilter(self)  # Install event filter
-        main_layout.addWidget(self.list_widget)
+        list_widget = QWidget()
+        list_layout = QVBoxLayout()
+        list_layout.setContentsMargins(0, 0, 0, 0)
+        list_widget.setLayout(list_layout)
+        main_layout.addWidget(list_widget)
+
+        if self.prescorer is not None:
+            queue_layout = QHBoxLayout()
+            self.order_combo = QComboBox()
+            self.order_combo.addItems(QUEUE_ORDERS)
+            self.order_combo.setToolTip("Pick an order again to re-sort with the latest scores")
+            self.order_combo.activated.connect(self.queue_order_changed)
+            queue_layout.addWidget(self.order_combo)
+            self.hide_unusable_checkbox = QCheckBox("Hide black/frozen")
+            self.hide_unusable_checkbox.toggled.connect(self.hide_unusable_toggled)
+            queue_layout.addWidget(self.hide_unusable_checkbox)
+            list_layout.addLayout(queue_layout)
+
+        self.list_view = QListView()
+        self.list_view.setModel(self.sort_model)
+        self.list_view.setUniformItemSizes(True)  # Lets the view lay out 100k rows without asking for each
+        if self.thumbnail_loader is not None:
+            self.list_view.setIconSize(THUMBNAIL_SIZE)
+        self.list_view.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.list_view.doubleClicked.connect(self.play_selected_video)
+        self.list_view.selectionModel().selectionChanged.connect(self.on_item_selection_changed)  # Connect selection change
+        self.list_view.installEventFilter(self)  # Install event filter
+        list_layout.addWidget(self.list_view)
 
         # Right side: media player
         media_player_widget = QWidget()
@@ -54,18 +203,42 @@ class VideoRanker(QMainWindow):
         media_player_widget.setLayout(media_layout)
         main_layout.addWidget(media_player_widget)
 
-        self.video_widget = QVideoWidget()
-        media_layout.addWidget(self.video_widget)
-
-        self.player = QMediaPlayer()
-        self.player.setVideoOutput(self.video_widget)
-        self.audio_output = QAudioOutput()
-        self.player.setAudioOutput(self.audio_output)
+        # The visible player plus standby players that keep the next (and optionally the
+        # previous) clip loaded and paused on its first frame, ready to be swapped in
+        self.video_stack = QStackedLayout()
+        video_container = QWidget()
+        video_container.setLayout(self.video_stack)
+        media_layout.addWidget(video_container)
+        self.slots = []
+        for _ in range(1 + int(self.prefetch_next) + int(self.prefetch_previous)):
+            player = QMediaPlayer()
+            audio_output = QAudioOutput()
+            player.setAudioOutput(audio_output)
+            video_widget = QVideoWidget()
+            player.setVideoOutput(video_widget)
+            self.video_stack.addWidget(video_widget)
+            slot = {"player": player, "audio_output": audio_output, "video_widget": video_widget, "path": None}
+            player.positionChanged.connect(self.active_only(slot, self.position_changed))
+            player.durationChanged.connect(self.active_only(slot, self.duration_changed))
+            player.mediaStatusChanged.connect(self.active_only(slot, self.media_status_changed))
+            player.errorOccurred.connect(self.active_only(slot, self.handle_error))
+            player.playbackStateChanged.connect(self.active_only(slot, self.playback_state_changed))
+            if metrics.enabled:
+                video_widget.videoSink().videoFrameChanged.connect(
+                    lambda frame, slot=slot: self.frame_shown(slot, frame)
+                )
+            self.slots.append(slot)
+        self.active_slot = None
 
         # Slider for timeline
         self.position_slider = QSlider(Qt.Orientation.Horizontal)
         self.position_slider.setRange(0, 0)
-        self.position_slider.sliderMoved.connect(self.set_position)
+        if self.sprite_loader is not None:
+            self.position_slider.sliderMoved.connect(self.scrub_moved)
+            self.position_slider.sliderReleased.connect(self.scrub_released)
+            self.scrub_label = QLabel(self, Qt.WindowType.ToolTip)
+        else:
+            self.position_slider.sliderMoved.connect(self.set_position)
         media_layout.addWidget(self.position_slider)
 
         # Playback controls
@@ -92,21 +265,99 @@ class VideoRanker(QMainWindow):
 
         media_layout.addLayout(controls_layout)
 
-        # Connect signals
-        self.player.positionChanged.connect(self.position_changed)
-        self.player.durationChanged.connect(self.duration_changed)
-        self.player.mediaStatusChanged.connect(self.media_status_changed)
-        self.player.errorOccurred.connect(self.handle_error)
-        self.player.playbackStateChanged.connect(self.playback_state_changed)
+        # Folder scan progress, shown only while a scan is running
+        self.scan_label = QLabel()
+        self.scan_progress = QProgressBar()
+        self.scan_progress.setRange(0, 0)
+        self.scan_progress.setMaximumWidth(120)
+        self.scan_cancel_button = QPushButton("Cancel")
+        self.scan_cancel_button.clicked.connect(self.cancel_scan)
+        for widget in (self.scan_label, self.scan_progress, self.scan_cancel_button):
+            self.statusBar().addPermanentWidget(widget)
+            widget.hide()
+
+        undo_shortcut = QShortcut(QKeySequence(QKeySequence.StandardKey.Undo), self)
+        undo_shortcut.activated.connect(self.undo_last_move)
+
+        self.activate_slot(self.slots[0])
+
+    def active_only(self, slot, handler):
+        # Standby players load in the background; only the visible one drives the UI
+        return lambda *args: handler(*args) if slot is self.active_slot else None
+
+    def activate_slot(self, slot):
+        previous = self.active_slot
+        if previous is slot:
+            return
+        if previous is not None:
+            previous["player"].pause()
+            previous["audio_output"].setMuted(True)
+        self.active_slot = slot
+        self.player = slot["player"]
+        self.audio_output = slot["audio_output"]
+        self.video_widget = slot["video_widget"]
+        self.audio_output.setMuted(False)
+        self.video_stack.setCurrentWidget(self.video_widget)
+        # The new player's signals fired while it was in standby; bring the controls up to date
+        self.duration_changed(self.player.duration())
+        self.position_changed(self.player.position())
+        self.playback_state_changed(self.player.playbackState())
+
+    def slot_for_path(self, video_path):
+        for slot in self.slots:
+            if slot["path"] == video_path:
+                return slot
+        return None
+
+    def prefetch_around(self, index):
+        wanted = []
+        if self.prefetch_next:
+            wanted.append(self.next_index(index))
+        if self.prefetch_previous:
+            wanted.append(index - 1)
+        # Clips that are about to be moved are left alone
+        wanted_paths = [
+            self.video_model.path(i) for i in wanted
+            if 0 <= i < len(self.video_model) and i not in self.target_paths
+        ]
+        free_slots = [
+            slot for slot in self.slots
+            if slot is not self.active_slot and slot["path"] not in wanted_paths
+        ]
+        for video_path in wanted_paths:
+            if self.sprite_loader is not None:
+                self.sprite_loader.request(video_path)  # Warm the cache for the next clip
+            if self.slot_for_path(video_path) is None and free_slots:
+                slot = free_slots.pop()
+                slot["path"] = video_path
+                slot["audio_output"].setMuted(True)
+                playback_path = self.playback_path(video_path)
+                metrics.start(
+                    "ttff_seconds", id(slot), load="prefetch", proxy=str(playback_path != video_path).lower()
+                )
+                slot["player"].setSource(QUrl.fromLocalFile(playback_path))
+                slot["player"].pause()  # Decode the first frame and hold it
+        if self.proxy_loader is not None:
+            # Proxies take a while to build; start on the clips after the next one as well
+            upcoming = index
+            for _ in range(PROXY_LOOKAHEAD):
+                upcoming = self.next_index(upcoming)
+                if upcoming >= len(self.video_model):
+                    break
+                self.proxy_loader.request(self.video_model.path(upcoming))
+
+    def playback_path(self, video_path):
+        # What the players load for a clip: its proxy once one has been built
+        if self.proxy_loader is None:
+            return video_path
+        return self.proxy_loader.playback_path(video_path)
 
     def populate_video_list_from_processed_videos(self):
-        for video_path, rating in self.processed_videos.items():
-            if os.path.exists(video_path):
-                self.video_list.append(video_path)
-                item = QListWidgetItem(os.path.basename(video_path) + ' ' + '★' * rating)
-                self.list_widget.addItem(item)
-            else:
-                print(f"Warning: {video_path} does not exist")
+        # Paths are checked lazily by the model, only for the rows that get shown
+        self.video_model.add_paths(list(self.processed_videos), self.processed_videos)
+        # Ratings imported from before content hashes were recorded get one in the background
+        unhashed = [path for path in self.processed_videos if path not in self.ratings_store.hashes]
+        self.content_index.request(unhashed, priority=0)
 
     def dragEnterEvent(self, event: QDragEnterEvent):
         if event.mimeData().hasUrls():
@@ -114,49 +365,164 @@ class VideoRanker(QMainWindow):
 
     def dropEvent(self, event: QDropEvent):
         urls = event.mimeData().urls()
+        files = []
         for url in urls:
             path = url.toLocalFile()
             if os.path.isdir(path):
                 self.add_videos_from_folder(path)
             else:
                 if self.is_video_file(path):
-                    self.add_video_file(path)
+                    files.append(path)
+        self.add_video_files(files)
 
     def add_videos_from_folder(self, folder_path):
-        for root, dirs, files in os.walk(folder_path):
-            for file in files:
-                if self.is_video_file(file):
-                    full_path = os.path.join(root, file)
-                    self.add_video_file(full_path)
+        # Returns right away; clips are added in batches as the scan finds them
+        self.scan_queue.append(folder_path)
+        if self.scan_thread is None:
+            self.start_next_scan()
+
+    def start_next_scan(self):
+        if not self.scan_queue:
+            self.scan_thread = None
+            for widget in (self.scan_label, self.scan_progress, self.scan_cancel_button):
+                widget.hide()
+            return
+        folder_path = self.scan_queue.popleft()
+        self.scan_thread = FolderScanThread([folder_path], self.is_video_file, parent=self)
+        self.scan_thread.batchFound.connect(self.add_video_files)
+        self.scan_thread.progress.connect(self.scan_progress_changed)
+        self.scan_thread.finished.connect(self.scan_finished)
+        self.scan_label.setText(f"Scanning {os.path.basename(folder_path) or folder_path}…")
+        for widget in (self.scan_label, self.scan_progress, self.scan_cancel_button):
+            widget.show()
+        self.scan_thread.start()
+
+    def scan_progress_changed(self, folders, found):
+        self.scan_label.setText(f"Scanning: {folders} folders, {found} clips")
+
+    def scan_finished(self):
+        self.scan_thread.deleteLater()
+        self.start_next_scan()
+
+    def cancel_scan(self):
+        self.scan_queue.clear()
+        if self.scan_thread is not None:
+            self.scan_thread.cancel()
 
     def add_video_file(self, file_path):
-        if file_path not in self.video_list:
-            self.video_list.append(file_path)
-            if file_path in self.processed_videos:
-                rating = self.processed_videos[file_path]
-                item = QListWidgetItem(os.path.basename(file_path) + ' ' + '★' * rating)
+        self.add_video_files([file_path])
+
+    def add_video_files(self, file_paths):
+        new_paths = self.video_model.add_paths(file_paths, self.processed_videos)
+        metrics.count("ingested_clips_total", len(new_paths))
+        self.content_index.request(new_paths)
+        if self.prescorer is not None:
+            self.prescorer.request(path for path in new_paths if path not in self.processed_videos)
+
+    def clips_hashed(self, results):
+        # One store write per batch, e.g. for the backfill of rated clips at startup
+        self.ratings_store.attach_hashes([
+            (video_path, content_hash) for video_path, content_hash in results
+            if video_path in self.processed_videos and video_path in self.video_model.rows
+        ])
+        for video_path, content_hash in results:
+            row = self.video_model.rows.get(video_path)
+            if row is None:
+                continue
+            first_row = self.hash_rows.setdefault(content_hash, row)
+            if video_path in self.processed_videos:
+                if first_row != row:
+                    # An unrated copy of this clip was listed before its hash was known
+                    self.flag_known_clip(first_row, content_hash)
+            elif first_row != row:
+                self.video_model.set_identity(row, IDENTITY_DUPLICATE)
+                self.video_model.set_rating(row, self.video_model.rating(first_row))
             else:
-                item = QListWidgetItem(os.path.basename(file_path))
-            self.list_widget.addItem(item)
+                self.flag_known_clip(row, content_hash)
+
+    def flag_known_clip(self, row, content_hash):
+        rating = self.ratings_store.content_rating(content_hash)
+        if rating and self.video_model.path(row) not in self.processed_videos:
+            self.video_model.set_identity(row, IDENTITY_KNOWN)
+            self.video_model.set_rating(row, rating)
+
+    def next_index(self, index):
+        # The next clip in queue order that still needs a rating; known and duplicate
+        # clips are skipped, and on a shared store clips that are rated or claimed.
+        # Returns len(video_model) at the end of the queue.
+        view_row = self.sort_model.mapFromSource(self.video_model.index(index)).row()
+        for row in range(view_row + 1, self.sort_model.rowCount()):
+            next_index = self.sort_model.mapToSource(self.sort_model.index(row, 0)).row()
+            if self.video_model.identity(next_index) != IDENTITY_NEW:
+                continue
+            if self.shared and (
+                self.video_model.rating(next_index)
+                or self.ratings_store.claimed_by(self.video_model.path(next_index))
+            ):
+                continue
+            return next_index
+        return len(self.video_model)
+
+    def claim_clip(self, video_path):
+        # Shared store: hold a lease on the clip on screen, and let go of the previous one
+        if self.claimed_path is not None and self.claimed_path != video_path:
+            self.ratings_store.release(self.claimed_path)
+        if self.ratings_store.claim(video_path):
+            self.claimed_path = video_path
+        else:
+            self.claimed_path = None
+            reviewer = self.ratings_store.claimed_by(video_path)
+            self.statusBar().showMessage(f"{os.path.basename(video_path)} is being reviewed by {reviewer}", 5000)
+
+    def renew_claim(self):
+        if self.claimed_path is not None:
+            self.ratings_store.claim(self.claimed_path)
+
+    def refresh_from_store(self):
+        # Shared store: apply what other reviewers rated and moved since the last poll
+        for video_path, rating, previous_path in self.ratings_store.refresh():
+            row = self.video_model.rows.get(video_path)
+            if row is None and previous_path is not None:
+                row = self.video_model.rows.get(previous_path)
+                if row is not None and row not in self.target_paths:
+                    self.video_model.set_path(row, video_path)
+            if row is not None and row not in self.target_paths:
+                self.video_model.set_rating(row, rating)
+
+    def select_row(self, index):
+        self.list_view.setCurrentIndex(self.sort_model.mapFromSource(self.video_model.index(index)))
+
+    def clip_scored(self, video_path, scores):
+        row = self.video_model.rows.get(video_path)
+        if row is not None:
+            self.video_model.set_metrics(row, scores)
+
+    def queue_order_changed(self):
+        field, descending = QUEUE_ORDERS[self.order_combo.currentText()]
+        self.sort_model.sort_by(field, descending)
+        if 0 <= self.current_index < len(self.video_model):
+            self.list_view.scrollTo(self.sort_model.mapFromSource(self.video_model.index(self.current_index)))
+
+    def hide_unusable_toggled(self, checked):
+        self.sort_model.set_hidden(UNUSABLE_THRESHOLDS if checked else {})
 
     def is_video_file(self, filename):
-        video_extensions = ['.mp4', '.avi', '.mov', '.mkv']
         ext = os.path.splitext(filename)[1].lower()
-        return ext in video_extensions
+        return ext in VIDEO_EXTENSIONS
 
-    def play_selected_video(self, item):
-        index = self.list_widget.row(item)
+    def play_selected_video(self, model_index):
+        index = self.sort_model.mapToSource(model_index).row()
         self.current_index = index
         self.play_video_at_index(index)
 
     def play_video_at_index(self, index):
-        if 0 <= index < len(self.video_list):
-            video_path = self.video_list[index]
-            self.player.setSource(QUrl.fromLocalFile(video_path))
+        if 0 <= index < len(self.video_model):
+            self.load_video_at_index(index)
+            self.awaiting_media_load = False
             self.player.play()
 
     def play_video(self):
-        if self.current_index == -1 and self.video_list:
+        if self.current_index == -1 and len(self.video_model):
             self.current_index = 0
             self.play_video_at_index(self.current_index)
         else:
@@ -169,8 +535,8 @@ class VideoRanker(QMainWindow):
         self.player.stop()
 
     def play_next_video(self):
-        self.current_index += 1
-        if self.current_index < len(self.video_list):
+        self.current_index = self.next_index(self.current_index)
+        if self.current_index < len(self.video_model):
             self.play_video_at_index(self.current_index)
         else:
             self.current_index = -1  # Reset index
@@ -182,10 +548,9 @@ class VideoRanker(QMainWindow):
             self.rate_current_video(rating)
         elif key == Qt.Key.Key_Return or key == Qt.Key.Key_Enter:
             # Play selected clip from the list
-            selected_items = self.list_widget.selectedItems()
-            if selected_items:
-                item = selected_items[0]
-                self.play_selected_video(item)
+            selected_indexes = self.list_view.selectedIndexes()
+            if selected_indexes:
+                self.play_selected_video(selected_indexes[0])
         elif key == Qt.Key.Key_Space:
             # Pause or resume the video
             if self.player.playbackState() == QMediaPlayer.PlaybackState.PlayingState:
@@ -194,7 +559,7 @@ class VideoRanker(QMainWindow):
                 self.player.play()
 
     def eventFilter(self, source, event):
-        if event.type() == QEvent.Type.KeyPress and source is self.list_widget:
+        if event.type() == QEvent.Type.KeyPress and source is self.list_view:
             key = event.key()
             if Qt.Key.Key_1.value <= key <= Qt.Key.Key_5.value:
                 rating = key - Qt.Key.Key_0.value
@@ -202,10 +567,9 @@ class VideoRanker(QMainWindow):
                 return True
             elif key == Qt.Key.Key_Return or key == Qt.Key.Key_Enter:
                 # Play selected clip from the list
-                selected_items = self.list_widget.selectedItems()
-                if selected_items:
-                    item = selected_items[0]
-                    self.play_selected_video(item)
+                selected_indexes = self.list_view.selectedIndexes()
+                if selected_indexes:
+                    self.play_selected_video(selected_indexes[0])
                 return True
             elif key == Qt.Key.Key_Space:
                 # Pause or resume the video
@@ -217,51 +581,163 @@ class VideoRanker(QMainWindow):
         return super().eventFilter(source, event)
 
     def rate_current_video(self, rating):
-        if 0 <= self.current_index < len(self.video_list):
-            video_path = self.video_list[self.current_index]
-            output_folder = os.path.join(os.getcwd(), str(rating))
-            os.makedirs(output_folder, exist_ok=True)
-            dest_path = os.path.join(output_folder, os.path.basename(video_path))
-            if not os.path.exists(dest_path):
-                try:
-                    self.player.stop()  # Stop the player before moving the file
-                    shutil.move(video_path, dest_path)
-                except Exception as e:
-                    print(f"Error moving file: {e}")
+        if 0 <= self.current_index < len(self.video_model):
+            index = self.current_index
+            source = self.target_paths.get(index, self.video_model.path(index))
+            dest_path = rating_destination(source, rating)
+            if dest_path == source:
+                return
+            if self.shared:
+                if not self.ratings_store.claim(source):
+                    reviewer = self.ratings_store.claimed_by(source)
+                    self.statusBar().showMessage(f"Not rated: {reviewer} is reviewing this clip", 5000)
                     return
-                # Update the path in video_list
-                self.video_list[self.current_index] = dest_path
-                # Update the processed_videos dict
-                if video_path in self.processed_videos:
-                    del self.processed_videos[video_path]
-                self.processed_videos[dest_path] = rating
-                self.save_json()
-                # Update the item text
-                item = self.list_widget.item(self.current_index)
-                item.setText(os.path.basename(dest_path) + ' ' + '★' * rating)
-                # Update the player's source to the new file path
-                self.player.setSource(QUrl.fromLocalFile(dest_path))
-            # if self.autoplay_checkbox.isChecked():
-            #     self.play_next_video()
-
-    def load_json(self):
-        if os.path.exists(self.json_file):
-            with open(self.json_file, 'r') as f:
-                self.processed_videos = json.load(f)
-
-    def save_json(self):
-        with open(self.json_file, 'w') as f:
-            json.dump(self.processed_videos, f)
+                # The claim now belongs to the move and is released when it finishes
+                if self.claimed_path == source:
+                    self.claimed_path = None
+            previous_rating = self.video_model.rating(index)
+            if self.video_model.identity(index) != IDENTITY_NEW:
+                # The rating shown belongs to another copy of the clip, not to this path
+                previous_rating = 0
+                self.video_model.set_identity(index, IDENTITY_NEW)
+            undo_entry = {
+                'index': index,
+                'source': source,
+                'rating': rating,
+                'previous_rating': previous_rating,
+            }
+            self.undo_stack.append(undo_entry)
+            metrics.start("rating_to_next_ready_seconds")
+            self.queue_move(index, source, dest_path, rating, undo_entry)
+            self.advance_after_rating(index)
+
+    def queue_move(self, index, source, dest_path, rating, tag):
+        # Let go of the file first; a player holding it open can block the move
+        slot = self.slot_for_path(self.video_model.path(index))
+        if slot is not None:
+            slot["player"].stop()
+            slot["player"].setSource(QUrl())
+            slot["path"] = None
+            metrics.cancel("ttff_seconds", id(slot))
+        self.target_paths[index] = dest_path
+        self.video_model.set_rating(index, rating)
+        self.video_model.set_move_state(index, MOVE_PENDING)
+        self.move_queue.submit(index, source, dest_path, tag)
+        self.update_move_status()
+
+    def advance_after_rating(self, index):
+        # Rating never waits for the file move; go straight on to the next clip
+        next_index = self.next_index(index)
+        if next_index < len(self.video_model):
+            self.select_row(next_index)
+            if self.autoplay_checkbox.isChecked():
+                self.awaiting_media_load = False
+                self.player.play()
+
+    def undo_last_move(self):
+        if not self.undo_stack:
+            return
+        undo_entry = self.undo_stack.pop()
+        index = undo_entry['index']
+        # Runs after the move it reverses, even if that one is still queued
+        source = self.target_paths.get(index, self.video_model.path(index))
+        if self.shared and not self.ratings_store.claim(source):
+            self.undo_stack.append(undo_entry)
+            reviewer = self.ratings_store.claimed_by(source)
+            self.statusBar().showMessage(f"Cannot undo: {reviewer} is reviewing this clip", 5000)
+            return
+        self.queue_move(index, source, undo_entry['source'], undo_entry['previous_rating'], {'undo': undo_entry})
+
+    def move_finished(self, index, tag, source, dest_path, error):
+        if self.shared:
+            self.ratings_store.release(source)
+        if error:
+            print(f"Error moving file: {error}")
+            if tag in self.undo_stack:
+                self.undo_stack.remove(tag)
+            self.video_model.set_move_state(index, MOVE_FAILED, error)
+        else:
+            self.video_model.set_path(index, dest_path)
+            self.content_index.rename(source, dest_path)
+            if 'undo' in tag:
+                previous_rating = tag['undo']['previous_rating']
+                if previous_rating:
+                    self.ratings_store.set_rating(dest_path, previous_rating, previous_path=source)
+                else:
+                    self.ratings_store.remove(source)
+            else:
+                self.ratings_store.set_rating(
+                    dest_path, tag['rating'], previous_path=source,
+                    content_hash=self.content_index.hash_for(dest_path),
+                )
+            self.video_model.set_move_state(index, MOVE_DONE)
+        if not self.move_queue.is_busy(index):
+            self.target_paths.pop(index, None)
+            # Show the rating that was actually recorded, e.g. after a failed move
+            self.video_model.set_rating(index, self.processed_videos.get(self.video_model.path(index)))
+        else:
+            self.video_model.set_move_state(index, MOVE_PENDING)
+        self.update_move_status()
+        if index == self.current_index and self.player.source().isEmpty():
+            self.load_video_at_index(index)
+
+    def update_move_status(self):
+        pending = self.move_queue.pending_count()
+        if pending:
+            self.statusBar().showMessage(f"Moving {pending} file(s)…")
+        else:
+            self.statusBar().clearMessage()
 
     def position_changed(self, position):
-        self.position_slider.setValue(position)
+        if not self.position_slider.isSliderDown():
+            self.position_slider.setValue(position)
 
     def duration_changed(self, duration):
         self.position_slider.setRange(0, duration)
 
     def set_position(self, position):
+        metrics.start("seek_seconds", id(self.active_slot))
+        self.seek_target = position
         self.player.setPosition(position)
 
+    def scrub_moved(self, position):
+        # No seeking while dragging; the nearest frame of the sprite sheet stands in
+        if self.sprite_sheet is None:
+            return
+        frame = self.sprite_sheet.frame_at(position, self.player.duration())
+        self.scrub_label.setPixmap(frame)
+        self.scrub_label.adjustSize()
+        slider = self.position_slider
+        handle_x = QStyle.sliderPositionFromValue(slider.minimum(), slider.maximum(), position, slider.width())
+        self.scrub_label.move(slider.mapToGlobal(QPoint(handle_x - frame.width() // 2, -frame.height() - 4)))
+        self.scrub_label.show()
+
+    def scrub_released(self):
+        self.scrub_label.hide()
+        self.set_position(self.position_slider.value())
+
+    def load_sprite_sheet(self, video_path):
+        self.sprite_sheet = None
+        if self.sprite_loader is not None:
+            sheet_path = self.sprite_loader.request(video_path)
+            if sheet_path is not None:
+                self.sprite_ready(video_path, sheet_path)
+
+    def sprite_ready(self, video_path, sheet_path):
+        if video_path == self.active_slot["path"]:
+            sheet = SpriteSheet(sheet_path)
+            if sheet.is_valid():
+                self.sprite_sheet = sheet
+
+    def frame_shown(self, slot, frame):
+        # Only connected when metrics are enabled
+        metrics.stop("ttff_seconds", id(slot))
+        if slot is not self.active_slot:
+            return
+        metrics.stop("rating_to_next_ready_seconds", prefetched="no")
+        if metrics.is_started("seek_seconds", id(slot)) and frame_near(frame, self.seek_target):
+            metrics.stop("seek_seconds", id(slot))
+
     def media_status_changed(self, status):
         if status == QMediaPlayer.MediaStatus.EndOfMedia:
             if self.autoplay_checkbox.isChecked():
@@ -291,22 +767,112 @@ class VideoRanker(QMainWindow):
 
     # New method to handle item selection changes
     def on_item_selection_changed(self):
-        selected_items = self.list_widget.selectedItems()
-        if selected_items:
-            item = selected_items[0]
-            index = self.list_widget.row(item)
+        selected_indexes = self.list_view.selectedIndexes()
+        if selected_indexes:
+            index = self.sort_model.mapToSource(selected_indexes[0]).row()
             self.current_index = index
             self.load_video_at_index(index)
 
     # New method to load video without playing
     def load_video_at_index(self, index):
-        if 0 <= index < len(self.video_list):
-            video_path = self.video_list[index]
-            self.player.setSource(QUrl.fromLocalFile(video_path))
-            self.awaiting_media_load = True  # Set the flag to wait for media load
+        if 0 <= index < len(self.video_model):
+            video_path = self.video_model.path(index)
+            slot = self.slot_for_path(video_path)
+            if slot is not None and slot is not self.active_slot:
+                # Prefetched: already paused on its first frame
+                self.activate_slot(slot)
+                self.awaiting_media_load = False
+                if self.player.mediaStatus() in (
+                    QMediaPlayer.MediaStatus.LoadedMedia, QMediaPlayer.MediaStatus.BufferedMedia
+                ):
+                    metrics.stop("rating_to_next_ready_seconds", prefetched="yes")
+            elif slot is None:
+                self.active_slot["path"] = video_path
+                playback_path = self.playback_path(video_path)
+                metrics.start(
+                    "ttff_seconds", id(self.active_slot), load="cold", proxy=str(playback_path != video_path).lower()
+                )
+                self.player.setSource(QUrl.fromLocalFile(playback_path))
+                self.awaiting_media_load = True  # Set the flag to wait for media load
+            self.load_sprite_sheet(video_path)
+            if self.shared and index not in self.target_paths:
+                self.claim_clip(video_path)
+            self.prefetch_around(index)
+
+    def closeEvent(self, event):
+        self.cancel_scan()
+        if self.scan_thread is not None:
+            self.scan_thread.wait()
+        # Finish queued moves so their ratings are recorded before the store closes
+        self.move_queue.wait()
+        self.thumbnail_runner.cancel_all()
+        self.sprite_runner.cancel_all()
+        self.proxy_runner.cancel_all()
+        self.content_index.close()
+        if self.prescorer is not None:
+            self.prescorer.close()
+        self.metadata_cache.close()
+        self.ratings_store.close()
+        metrics.close()
+        super().closeEvent(event)
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = VideoRanker()
+    if len(sys.argv) > 1 and sys.argv[1] in ranker_batch.BATCH_COMMANDS:
+        # Headless batch mode, e.g. `rank_videos.py apply ratings.csv`
+        sys.exit(ranker_batch.main(sys.argv[1:]))
+
+    parser = argparse.ArgumentParser(description="Rate videos with the keys 1-5")
+    parser.add_argument(
+        "--store",
+        default=DEFAULT_STORE,
+        help="ratings store; a .jsonl file uses an append-only journal, anything else SQLite",
+    )
+    parser.add_argument(
+        "--reviewer",
+        help="share the store with other reviewers under this name: clips are claimed while "
+        "they are reviewed and other reviewers' ratings show up live",
+    )
+    parser.add_argument("--no-thumbnails", action="store_true", help="do not show keyframe strips in the list")
+    parser.add_argument("--thumbnail-cache-mb", type=int, default=512, help="size cap of the thumbnail cache")
+    parser.add_argument(
+        "--prescore", action="store_true", help="analyze new clips so the queue can be sorted and filtered"
+    )
+    parser.add_argument(
+        "--no-scrub-previews", action="store_true", help="seek while the position slider is dragged instead"
+    )
+    parser.add_argument("--scrub-cache-mb", type=int, default=1024, help="size cap of the scrub sprite cache")
+    parser.add_argument(
+        "--proxies", action="store_true", help="play 540p H.264 proxies of heavy clips, built in the background"
+    )
+    parser.add_argument("--proxy-workers", type=int, default=1, help="proxies transcoded at the same time")
+    parser.add_argument("--proxy-cache-gb", type=float, default=20, help="size cap of the proxy cache")
+    parser.add_argument("--no-prefetch", action="store_true", help="do not preload the next clip")
+    parser.add_argument("--prefetch-previous", action="store_true", help="also keep the previous clip loaded")
+    parser.add_argument(
+        "--metrics-file",
+        help="write playback and ingest timings here; .json for JSON, anything else Prometheus text format",
+    )
+    parser.add_argument("--metrics-interval", type=float, default=10, help="seconds between metrics writes")
+    args, qt_args = parser.parse_known_args()
+    if args.reviewer and args.store.endswith(".jsonl"):
+        parser.error("--reviewer needs an SQLite store, not a .jsonl journal")
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    if args.metrics_file:
+        metrics.enable(args.metrics_file, "rank_videos", args.metrics_interval)
+    window = VideoRanker(
+        store_path=args.store,
+        thumbnails=not args.no_thumbnails,
+        thumbnail_cache_bytes=args.thumbnail_cache_mb << 20,
+        prefetch=not args.no_prefetch,
+        prefetch_previous=args.prefetch_previous,
+        prescore=args.prescore,
+        scrub_previews=not args.no_scrub_previews,
+        scrub_cache_bytes=args.scrub_cache_mb << 20,
+        proxies=args.proxies,
+        proxy_workers=args.proxy_workers,
+        proxy_cache_bytes=int(args.proxy_cache_gb * (1 << 30)),
+        reviewer=args.reviewer,
+    )
     window.show()
     sys.exit(app.exec())
@@ -0,0 +1,239 @@
+import os
+import sys
+import csv
+import json
+import shutil
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ratings_store import open_ratings_store, DEFAULT_STORE, LEGACY_JSON_FILE
+from move_queue import move_file, rating_folder, rating_destination, VIDEO_EXTENSIONS
+from metadata_cache import partial_content_hash
+
+# Headless batch operations on the ranker's ratings: the same store and the same rating
+# folders as rank_videos.py, without a display. File operations run on a thread pool;
+# every store update happens on the main thread as the operations complete. Clips are
+# claimed in the store before they are moved, so a batch never moves a clip that a
+# reviewer has on screen, and reviewers never get a clip the batch is moving.
+# Run as `python ranker_batch.py ...` or `python rank_videos.py <command> ...`.
+
+BATCH_COMMANDS = ("apply", "resort", "export")
+RATINGS = range(1, 6)
+
+
+def read_ratings_file(path):
+    # CSV with path,rating rows (a header row is optional), or JSON: either
+    # {"path": rating} like processed_videos.json or [{"path": ..., "rating": ...}]
+    if path.endswith(".json"):
+        with open(path, "r") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            items = data.items()
+        else:
+            items = [(entry["path"], entry["rating"]) for entry in data]
+    else:
+        with open(path, "r", newline="") as f:
+            items = [row[:2] for row in csv.reader(f) if len(row) >= 2]
+    ratings = []
+    for video_path, rating in items:
+        try:
+            rating = int(rating)
+        except ValueError:
+            continue  # Header row
+        if rating not in RATINGS:
+            print(f"Warning: skipping {video_path}, rating {rating} is not 1-5")
+            continue
+        ratings.append((os.path.abspath(video_path), rating))
+    return ratings
+
+
+def claim(store, video_path, dry_run=False):
+    # A dry run only checks the claims other processes hold
+    free = store.claimed_by(video_path) is None if dry_run else store.claim(video_path)
+    if free:
+        return True
+    print(f"Warning: skipping {video_path}, {store.claimed_by(video_path)} is reviewing it")
+    return False
+
+
+def move_and_hash(source, dest):
+    move_file(source, dest)
+    return partial_content_hash(dest)
+
+
+def copy_file(source, dest, link=False):
+    if os.path.exists(dest):
+        raise FileExistsError(f"{dest} already exists")
+    os.makedirs(os.path.dirname(os.path.abspath(dest)), exist_ok=True)
+    if link:
+        os.link(source, dest)
+    else:
+        shutil.copy2(source, dest)
+
+
+def run_operations(operations, workers, dry_run, on_done=None):
+    # operations: [(description, function, args, result_tag)]
+    counts = {"done": 0, "failed": 0}
+    if dry_run:
+        for description, _, _, _ in operations:
+            print(f"Would {description}")
+        counts["done"] = len(operations)
+        return counts
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(function, *args): (description, tag)
+            for description, function, args, tag in operations
+        }
+        for number, future in enumerate(as_completed(futures), 1):
+            description, tag = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error: could not {description}: {e}")
+                counts["failed"] += 1
+                continue
+            counts["done"] += 1
+            if on_done is not None:
+                on_done(tag, result)
+            if number % 100 == 0 or number == len(operations):
+                print(f"{number}/{len(operations)}")
+    return counts
+
+
+def apply_ratings(store, args):
+    # Rate clips from a file: each clip is moved into its rating folder and recorded
+    operations = []
+    for video_path, rating in read_ratings_file(args.file):
+        dest_path = rating_destination(video_path, rating, args.root)
+        if dest_path == video_path:
+            if store.get(video_path) == rating:
+                pass
+            elif args.dry_run:
+                print(f"Would record {video_path} as rated {rating}")
+            else:
+                store.set_rating(video_path, rating)
+            continue
+        if not claim(store, video_path, args.dry_run):
+            continue
+        operations.append((
+            f"move {video_path} to {dest_path}",
+            move_and_hash,
+            (video_path, dest_path),
+            (video_path, dest_path, rating),
+        ))
+
+    def on_done(tag, content_hash):
+        video_path, dest_path, rating = tag
+        store.set_rating(dest_path, rating, previous_path=video_path, content_hash=content_hash)
+
+    return run_operations(operations, args.workers, args.dry_run, on_done)
+
+
+def resort_folders(store, args):
+    # Bring the rating folders in line with the store: clips whose recorded rating
+    # differs from their folder are moved, clips without a rating take their folder's
+    operations = []
+    for folder_rating in RATINGS:
+        folder = rating_folder(folder_rating, args.root)
+        if not os.path.isdir(folder):
+            continue
+        with os.scandir(folder) as it:
+            for entry in it:
+                if not entry.is_file() or os.path.splitext(entry.name)[1].lower() not in VIDEO_EXTENSIONS:
+                    continue
+                video_path = entry.path
+                rating = store.get(video_path)
+                if rating is None:
+                    if args.dry_run:
+                        print(f"Would record {video_path} as rated {folder_rating}")
+                    else:
+                        store.set_rating(video_path, folder_rating)
+                elif rating != folder_rating and claim(store, video_path, args.dry_run):
+                    dest_path = rating_destination(video_path, rating, args.root)
+                    operations.append((
+                        f"move {video_path} to {dest_path}",
+                        move_file,
+                        (video_path, dest_path),
+                        (video_path, dest_path, rating),
+                    ))
+
+    def on_done(tag, result):
+        video_path, dest_path, rating = tag
+        store.set_rating(dest_path, rating, previous_path=video_path)
+
+    return run_operations(operations, args.workers, args.dry_run, on_done)
+
+
+def export_selection(store, args):
+    # Copy (or hard link) every clip with one of the given ratings into a folder,
+    # optionally split into one subfolder per rating; the originals stay where they are
+    wanted = {int(rating) for rating in args.ratings.split(",")}
+    operations = []
+    for video_path, rating in list(store.ratings.items()):
+        if rating not in wanted:
+            continue
+        dest_folder = os.path.join(args.to, str(rating)) if args.split else args.to
+        dest_path = os.path.join(dest_folder, os.path.basename(video_path))
+        verb = "link" if args.link else "copy"
+        operations.append((
+            f"{verb} {video_path} to {dest_path}",
+            copy_file,
+            (video_path, dest_path, args.link),
+            None,
+        ))
+    return run_operations(operations, args.workers, args.dry_run)
+
+
+def main(argv=None):
+    # Shared options go after the command, e.g. `apply ratings.csv --workers 8 --dry-run`
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--store", default=DEFAULT_STORE, help="ratings store, as for rank_videos.py")
+    common.add_argument("--reviewer", help="open a store shared with reviewers, as for rank_videos.py")
+    common.add_argument("--root", default=None, help="folder that holds the rating folders (default: cwd)")
+    common.add_argument("--workers", type=int, default=4, help="file operations to run in parallel")
+    common.add_argument("--dry-run", action="store_true", help="print what would be done without doing it")
+
+    parser = argparse.ArgumentParser(description="Batch operations on video ratings, without the GUI")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    apply_parser = commands.add_parser(
+        "apply", parents=[common], help="rate clips from a CSV (path,rating) or JSON file"
+    )
+    apply_parser.add_argument("file")
+
+    commands.add_parser(
+        "resort", parents=[common], help="move clips in the rating folders to match their recorded rating"
+    )
+
+    export_parser = commands.add_parser(
+        "export", parents=[common], help="copy clips with the given ratings into a folder"
+    )
+    export_parser.add_argument("ratings", help="comma-separated ratings, e.g. 4,5")
+    export_parser.add_argument("--to", required=True, help="destination folder")
+    export_parser.add_argument("--split", action="store_true", help="one subfolder per rating")
+    export_parser.add_argument("--link", action="store_true", help="hard link instead of copying")
+
+    args = parser.parse_args(argv)
+    if args.reviewer and args.store.endswith(".jsonl"):
+        parser.error("--reviewer needs an SQLite store, not a .jsonl journal")
+    # Claims taken for the moves are released when the store is closed; a dry run
+    # works on a read-only snapshot and writes nothing
+    store = open_ratings_store(
+        args.store, legacy_json=LEGACY_JSON_FILE, reviewer=args.reviewer, read_only=args.dry_run
+    )
+    try:
+        if args.command == "apply":
+            counts = apply_ratings(store, args)
+        elif args.command == "resort":
+            counts = resort_folders(store, args)
+        else:
+            counts = export_selection(store, args)
+    finally:
+        store.close()
+    prefix = "Would process" if args.dry_run else "Processed"
+    print(f"{prefix} {counts['done']} file(s), {counts['failed']} failed")
+    return 1 if counts["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,469 @@
+import os
+import json
+import time
+import socket
+import getpass
+import sqlite3
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+DEFAULT_STORE = 'processed_videos.db'
+LEGACY_JSON_FILE = 'processed_videos.json'  # Written by older versions of rank_videos.py
+LEASE_SECONDS = 300  # A claim on a clip lapses unless it is renewed within this time
+CHANGE_LOG_SIZE = 100000  # Changes kept for other processes to pick up
+
+
+class RatingsStore(ABC):
+    # Ratings keyed by clip path. Every change is committed on its own, so a rating
+    # costs O(1) on disk no matter how many clips have been rated, and a crash never
+    # loses more than the change that was being written. When the content hash of a
+    # clip is known it is stored with the rating, so a renamed or re-copied clip can
+    # be recognised by its content.
+    def __init__(self):
+        self.ratings = {}  # path -> rating, kept in memory for lookups
+        self.hashes = {}  # path -> content hash, for rated clips whose hash is known
+        self.content_ratings = {}  # content hash -> rating
+
+    def get(self, video_path):
+        return self.ratings.get(video_path)
+
+    def content_rating(self, content_hash):
+        return self.content_ratings.get(content_hash)
+
+    def set_rating(self, video_path, rating, previous_path=None, content_hash=None):
+        # previous_path is dropped in the same commit, for clips that were moved
+        content_hash = self.apply_rating(video_path, rating, previous_path, content_hash)
+        self.write_rating(video_path, rating, previous_path, content_hash)
+
+    def apply_rating(self, video_path, rating, previous_path=None, content_hash=None):
+        # The in-memory half of set_rating; returns the content hash recorded with it
+        if previous_path is not None and previous_path != video_path:
+            self.ratings.pop(previous_path, None)
+            previous_hash = self.hashes.pop(previous_path, None)
+            if content_hash is None:
+                content_hash = previous_hash
+        if content_hash is None:
+            content_hash = self.hashes.get(video_path)
+        self.ratings[video_path] = rating
+        self.index_hash(video_path, content_hash, rating)
+        return content_hash
+
+    def attach_hashes(self, hashes):
+        # Record the content hashes of clips that were rated before their hash was known,
+        # [(path, hash)], in a single write
+        changed = []
+        for video_path, content_hash in hashes:
+            rating = self.ratings.get(video_path)
+            if rating is not None and self.hashes.get(video_path) != content_hash:
+                self.index_hash(video_path, content_hash, rating)
+                changed.append((video_path, rating, content_hash))
+        if changed:
+            self.write_hashes(changed)
+
+    def remove(self, video_path):
+        if self.apply_removal(video_path):
+            self.write_removal(video_path)
+
+    def apply_removal(self, video_path):
+        if self.ratings.pop(video_path, None) is None:
+            return False
+        content_hash = self.hashes.pop(video_path, None)
+        if content_hash is not None and content_hash not in self.hashes.values():
+            self.content_ratings.pop(content_hash, None)
+        return True
+
+    def index_hash(self, video_path, content_hash, rating):
+        if content_hash is not None:
+            self.hashes[video_path] = content_hash
+            self.content_ratings[content_hash] = rating
+
+    def import_json(self, json_path):
+        # One-time import of the processed_videos.json written by older versions
+        with open(json_path, "r") as f:
+            ratings = json.load(f)
+        self.ratings.update(ratings)
+        self.write_all(ratings)
+        print(f"Imported {len(ratings)} ratings from {json_path}")
+
+    # The on-disk half of every change, implemented by each backend
+    @abstractmethod
+    def write_rating(self, video_path, rating, previous_path, content_hash):
+        pass
+
+    @abstractmethod
+    def write_removal(self, video_path):
+        pass
+
+    @abstractmethod
+    def write_all(self, ratings):
+        pass
+
+    @abstractmethod
+    def write_hashes(self, records):
+        # records: [(path, rating, hash)]
+        pass
+
+    # Claims and refreshes only matter when several processes share a store; by default
+    # a store has a single writer, which can always claim every clip
+    def claim(self, video_path):
+        return True
+
+    def release(self, video_path):
+        pass
+
+    def claimed_by(self, video_path):
+        return None
+
+    def refresh(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class SqliteRatingsStore(RatingsStore):
+    # Besides the ratings, every change goes into a change log that other processes
+    # poll with refresh(), and clips can be claimed for a while (a lease) so that two
+    # reviewers never rate or move the same clip. With a reviewer name the store is
+    # opened for sharing, e.g. on a network drive: a rollback journal instead of WAL,
+    # which needs shared memory between the processes, and a long busy timeout.
+    def __init__(self, db_path, reviewer=None):
+        super().__init__()
+        self.db_path = db_path
+        self.shared = reviewer is not None
+        self.reviewer = reviewer or getpass.getuser()
+        # Identifies this process in the change log and the claims
+        self.owner = f"{self.reviewer}@{socket.gethostname()}:{os.getpid()}"
+        self.claims = {}  # path -> (reviewer, expiry) of other processes' claims
+        # Transactions are managed explicitly, see transaction()
+        self.connection = sqlite3.connect(db_path, timeout=30 if self.shared else 5, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=DELETE" if self.shared else "PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=FULL" if self.shared else "PRAGMA synchronous=NORMAL")
+        with self.transaction():
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS ratings (path TEXT PRIMARY KEY, rating INTEGER, content_hash TEXT)"
+            )
+            columns = [row[1] for row in self.connection.execute("PRAGMA table_info(ratings)")]
+            if "content_hash" not in columns:
+                self.connection.execute("ALTER TABLE ratings ADD COLUMN content_hash TEXT")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, path TEXT, "
+                "rating INTEGER, previous_path TEXT, content_hash TEXT, owner TEXT)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS claims (path TEXT PRIMARY KEY, owner TEXT, reviewer TEXT, expires REAL)"
+            )
+            self.connection.execute(
+                "DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?", (CHANGE_LOG_SIZE,)
+            )
+            self.connection.execute("DELETE FROM claims WHERE expires < ?", (time.time(),))
+            # Read in the same transaction, so no change falls between the two
+            self.last_seq = self.connection.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+            for video_path, rating, content_hash in self.connection.execute(
+                "SELECT path, rating, content_hash FROM ratings"
+            ):
+                self.ratings[video_path] = rating
+                self.index_hash(video_path, content_hash, rating)
+        self.data_version = None
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front: concurrent writers wait on the
+        # busy timeout instead of failing when a read lock cannot be upgraded
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def write_rating(self, video_path, rating, previous_path, content_hash):
+        with self.transaction():
+            if previous_path is not None and previous_path != video_path:
+                self.connection.execute("DELETE FROM ratings WHERE path = ?", (previous_path,))
+            self.connection.execute(
+                "INSERT OR REPLACE INTO ratings VALUES (?, ?, ?)", (video_path, rating, content_hash)
+            )
+            self.log_change(video_path, rating, previous_path, content_hash)
+
+    def write_removal(self, video_path):
+        with self.transaction():
+            self.connection.execute("DELETE FROM ratings WHERE path = ?", (video_path,))
+            self.log_change(video_path, None, None, None)
+
+    def log_change(self, video_path, rating, previous_path, content_hash):
+        self.connection.execute(
+            "INSERT INTO changes (path, rating, previous_path, content_hash, owner) VALUES (?, ?, ?, ?, ?)",
+            (video_path, rating, previous_path, content_hash, self.owner),
+        )
+
+    def write_all(self, ratings):
+        with self.transaction():
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO ratings (path, rating) VALUES (?, ?)", ratings.items()
+            )
+
+    def write_hashes(self, records):
+        # Not a rating change, so not logged: other processes learn the hashes when
+        # they open the store
+        with self.transaction():
+            self.connection.executemany(
+                "UPDATE ratings SET content_hash = ? WHERE path = ?",
+                [(content_hash, video_path) for video_path, _, content_hash in records],
+            )
+
+    def claim(self, video_path, lease=LEASE_SECONDS):
+        # Claims video_path for this process, or renews the claim; False while another
+        # process holds an unexpired claim on it (see claimed_by)
+        now = time.time()
+        with self.transaction():
+            row = self.connection.execute(
+                "SELECT owner, reviewer, expires FROM claims WHERE path = ?", (video_path,)
+            ).fetchone()
+            if row is not None and row[0] != self.owner and row[2] > now:
+                self.claims[video_path] = (row[1], row[2])
+                return False
+            self.connection.execute(
+                "INSERT OR REPLACE INTO claims VALUES (?, ?, ?, ?)",
+                (video_path, self.owner, self.reviewer, now + lease),
+            )
+        self.claims.pop(video_path, None)
+        return True
+
+    def release(self, video_path):
+        with self.transaction():
+            self.connection.execute("DELETE FROM claims WHERE path = ? AND owner = ?", (video_path, self.owner))
+
+    def claimed_by(self, video_path):
+        # The reviewer holding a claim on video_path as of the last refresh, if it is not us
+        claim = self.claims.get(video_path)
+        if claim is None or claim[1] <= time.time():
+            return None
+        return claim[0]
+
+    def refresh(self):
+        # Picks up what other processes changed since the last refresh. Returns their
+        # changes as [(path, rating or None for a removal, previous path)], already
+        # applied to the in-memory ratings; cheap when nothing has changed.
+        data_version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self.data_version:
+            return []
+        self.data_version = data_version
+        self.connection.execute("BEGIN")
+        try:
+            rows = self.connection.execute(
+                "SELECT seq, path, rating, previous_path, content_hash, owner FROM changes "
+                "WHERE seq > ? ORDER BY seq",
+                (self.last_seq,),
+            ).fetchall()
+            now = time.time()
+            self.claims = {
+                video_path: (reviewer, expires)
+                for video_path, reviewer, expires in self.connection.execute(
+                    "SELECT path, reviewer, expires FROM claims WHERE owner != ? AND expires > ?",
+                    (self.owner, now),
+                )
+            }
+        finally:
+            self.connection.execute("COMMIT")
+        changes = []
+        for seq, video_path, rating, previous_path, content_hash, owner in rows:
+            self.last_seq = seq
+            if owner == self.owner:
+                continue
+            if rating is None:
+                self.apply_removal(video_path)
+            else:
+                self.apply_rating(video_path, rating, previous_path, content_hash)
+            changes.append((video_path, rating, previous_path))
+        return changes
+
+    def close(self):
+        with self.transaction():
+            self.connection.execute("DELETE FROM claims WHERE owner = ?", (self.owner,))
+        if not self.shared:
+            # Fold the WAL back into the database so it does not grow across sessions
+            self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        self.connection.close()
+
+
+class JournalRatingsStore(RatingsStore):
+    # Append-only JSON lines journal, one record per change ({"path", "rating", "hash"},
+    # with a null rating for removals). It is compacted into a snapshot of the current
+    # ratings once it holds mostly superseded records.
+    def __init__(self, journal_path, compact_ratio=2, compact_min_records=1000):
+        super().__init__()
+        self.journal_path = journal_path
+        self.compact_ratio = compact_ratio
+        self.compact_min_records = compact_min_records
+        self.records = 0
+        if os.path.exists(journal_path):
+            self.replay()
+        self.journal = open(journal_path, "a")
+        self.compact_if_needed()
+
+    def replay(self):
+        with open(self.journal_path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                # A torn last line from a crash mid-write; everything before it is intact.
+                # Cut it off so the next record does not get appended to it.
+                print(f"Warning: dropping an incomplete record at the end of {self.journal_path}")
+                data = data[: data.rfind(b"\n") + 1]
+                f.truncate(len(data))
+        self.records += replay_journal(self, data.decode().splitlines(), self.journal_path)
+
+    def append(self, records):
+        for record in records:
+            self.journal.write(self.format_record(*record))
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        self.records += len(records)
+        self.compact_if_needed()
+
+    def format_record(self, video_path, rating, content_hash=None):
+        record = {"path": video_path, "rating": rating}
+        if content_hash is not None:
+            record["hash"] = content_hash
+        return json.dumps(record) + "\n"
+
+    def write_rating(self, video_path, rating, previous_path, content_hash):
+        records = [(video_path, rating, content_hash)]
+        if previous_path is not None and previous_path != video_path:
+            records.insert(0, (previous_path, None))
+        self.append(records)
+
+    def write_removal(self, video_path):
+        self.append([(video_path, None)])
+
+    def write_all(self, ratings):
+        self.append(list(ratings.items()))
+
+    def write_hashes(self, records):
+        self.append(records)
+
+    def compact_if_needed(self):
+        if self.records > max(self.compact_min_records, self.compact_ratio * len(self.ratings)):
+            self.compact()
+
+    def compact(self):
+        # Write a snapshot next to the journal and swap it in atomically
+        temp_path = self.journal_path + ".tmp"
+        with open(temp_path, "w") as f:
+            for video_path, rating in self.ratings.items():
+                f.write(self.format_record(video_path, rating, self.hashes.get(video_path)))
+            f.flush()
+            os.fsync(f.fileno())
+        self.journal.close()
+        os.replace(temp_path, self.journal_path)
+        if hasattr(os, "O_DIRECTORY"):
+            directory = os.open(os.path.dirname(os.path.abspath(self.journal_path)), os.O_DIRECTORY)
+            try:
+                os.fsync(directory)
+            finally:
+                os.close(directory)
+        self.journal = open(self.journal_path, "a")
+        self.records = len(self.ratings)
+
+    def close(self):
+        self.journal.close()
+
+
+class SnapshotRatingsStore(RatingsStore):
+    # A read-only copy of a store's ratings and of other processes' claims, for dry
+    # runs. Writes only change the copy in memory; a store that does not exist yet is
+    # not created, its legacy JSON is read instead of imported.
+    def __init__(self, store_path, legacy_json=None):
+        super().__init__()
+        self.claims = {}  # path -> (reviewer, expiry)
+        if not os.path.exists(store_path):
+            if legacy_json and os.path.exists(legacy_json):
+                with open(legacy_json, "r") as f:
+                    self.ratings.update(json.load(f))
+        elif store_path.endswith(".jsonl"):
+            with open(store_path, "rb") as f:
+                lines = f.read().decode().splitlines(keepends=True)
+            if lines and not lines[-1].endswith("\n"):
+                lines.pop()  # A torn last line from a crash mid-write
+            replay_journal(self, lines, store_path)
+        else:
+            connection = sqlite3.connect(f"file:{store_path}?mode=ro", uri=True, timeout=30)
+            try:
+                for video_path, rating, content_hash in connection.execute(
+                    "SELECT path, rating, content_hash FROM ratings"
+                ):
+                    self.ratings[video_path] = rating
+                    self.index_hash(video_path, content_hash, rating)
+                tables = {row[0] for row in connection.execute("SELECT name FROM sqlite_master")}
+                if "claims" in tables:
+                    self.claims = {
+                        video_path: (reviewer, expires)
+                        for video_path, reviewer, expires in connection.execute(
+                            "SELECT path, reviewer, expires FROM claims WHERE expires > ?", (time.time(),)
+                        )
+                    }
+            finally:
+                connection.close()
+
+    def write_rating(self, video_path, rating, previous_path, content_hash):
+        pass
+
+    def write_removal(self, video_path):
+        pass
+
+    def write_all(self, ratings):
+        pass
+
+    def write_hashes(self, records):
+        pass
+
+    def claim(self, video_path):
+        return self.claimed_by(video_path) is None
+
+    def claimed_by(self, video_path):
+        claim = self.claims.get(video_path)
+        if claim is None or claim[1] <= time.time():
+            return None
+        return claim[0]
+
+
+def replay_journal(store, lines, journal_path):
+    # Applies journal records to store's in-memory ratings; returns the number replayed
+    records = 0
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            print(f"Warning: skipping a damaged record in {journal_path}")
+            continue
+        records += 1
+        if record["rating"] is None:
+            store.ratings.pop(record["path"], None)
+            store.hashes.pop(record["path"], None)
+        else:
+            store.ratings[record["path"]] = record["rating"]
+            store.index_hash(record["path"], record.get("hash"), record["rating"])
+    # Rebuild from the final state, so clips removed later in the journal do not count
+    store.content_ratings = {
+        content_hash: store.ratings[video_path] for video_path, content_hash in store.hashes.items()
+    }
+    return records
+
+
+def open_ratings_store(store_path, legacy_json=None, reviewer=None, read_only=False):
+    # The backend is picked from the file name: .jsonl for the journal, SQLite otherwise.
+    # A reviewer name opens an SQLite store for sharing between several reviewers;
+    # read_only opens a snapshot that never writes to disk, e.g. for dry runs.
+    is_new = not os.path.exists(store_path)
+    if store_path.endswith(".jsonl") and reviewer is not None:
+        raise ValueError("a journal store has a single writer; share an SQLite store between reviewers")
+    if read_only:
+        return SnapshotRatingsStore(store_path, legacy_json)
+    if store_path.endswith(".jsonl"):
+        store = JournalRatingsStore(store_path)
+    else:
+        store = SqliteRatingsStore(store_path, reviewer)
+    if is_new and legacy_json and os.path.exists(legacy_json):
+        store.import_json(legacy_json)
+    return store
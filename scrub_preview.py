@@ -0,0 +1,78 @@
+from PyQt6.QtCore import QRect
+from PyQt6.QtGui import QPixmap
+
+from thumbnail_cache import ThumbnailLoader
+
+SPRITE_COLUMNS = 10
+SPRITE_ROWS = 10
+SPRITE_WIDTH = 192  # Width of one frame in the sheet
+
+
+def sprite_command(video_path, output_path, duration, columns=SPRITE_COLUMNS, rows=SPRITE_ROWS, width=SPRITE_WIDTH):
+    # One sheet of columns x rows evenly spaced frames, left to right and top to bottom;
+    # frame k shows the clip at k * duration / (columns * rows). Like the list strips only
+    # keyframes are decoded, so a long-GOP 4K clip costs a few keyframe decodes, not a
+    # full decode; each frame is the nearest keyframe before its time.
+    duration = max(duration, 0.1)
+    frames = columns * rows
+    return [
+        "ffmpeg",
+        "-y",
+        "-v",
+        "error",
+        "-skip_frame",
+        "nokey",
+        "-i",
+        video_path,
+        "-an",
+        "-vf",
+        f"tpad=stop_mode=clone:stop_duration={duration:.3f},fps={frames}/{duration:.3f},"
+        f"scale={width}:-2,tile={columns}x{rows}",
+        "-frames:v",
+        "1",
+        "-q:v",
+        "4",
+        output_path,
+    ]
+
+
+class SpriteLoader(ThumbnailLoader):
+    # Builds scrub sprite sheets the same way ThumbnailLoader builds list strips and
+    # announces them with thumbnailReady
+    kind = "scrub preview"
+
+    def __init__(self, cache, metadata_cache, runner, columns=SPRITE_COLUMNS, rows=SPRITE_ROWS,
+                 width=SPRITE_WIDTH, max_queued=8, parent=None):
+        super().__init__(cache, metadata_cache, runner, max_queued=max_queued, parent=parent)
+        self.columns = columns
+        self.rows = rows
+        self.width = width
+
+    def build_command(self, video_path, output_path, info):
+        return sprite_command(video_path, output_path, info["duration"], self.columns, self.rows, self.width)
+
+
+class SpriteSheet:
+    # A loaded sheet; frame_at picks the frame nearest to a playback position
+    def __init__(self, sheet_path, columns=SPRITE_COLUMNS, rows=SPRITE_ROWS):
+        self.pixmap = QPixmap(sheet_path)
+        self.columns = columns
+        self.rows = rows
+        self.frames = {}  # frame number -> QPixmap, cut out on first use
+
+    def is_valid(self):
+        return not self.pixmap.isNull()
+
+    def frame_at(self, position, duration):
+        # position and duration in milliseconds
+        count = self.columns * self.rows
+        number = min(count - 1, max(0, round(position * count / duration))) if duration > 0 else 0
+        frame = self.frames.get(number)
+        if frame is None:
+            width = self.pixmap.width() // self.columns
+            height = self.pixmap.height() // self.rows
+            x = (number % self.columns) * width
+            y = (number // self.columns) * height
+            frame = self.pixmap.copy(QRect(x, y, width, height))
+            self.frames[number] = frame
+        return frame
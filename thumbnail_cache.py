@@ -0,0 +1,140 @@
+import hashlib
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from disk_cache import DiskCache
+from ffmpeg_jobs import FfmpegJob
+from metadata_cache import file_signature, probe_command, parse_probe_output
+
+
+def strip_command(video_path, output_path, duration, frames=4, height=36):
+    # One image with `frames` evenly spaced frames side by side. Only keyframes are
+    # decoded, which is what keeps this cheap on long-GOP sources; tpad repeats the last
+    # keyframe so short clips with a single keyframe still fill the strip.
+    duration = max(duration, 0.1)
+    return [
+        "ffmpeg",
+        "-y",
+        "-v",
+        "error",
+        "-skip_frame",
+        "nokey",
+        "-i",
+        video_path,
+        "-an",
+        "-vf",
+        f"tpad=stop_mode=clone:stop_duration={duration:.3f},fps={frames}/{duration:.3f},"
+        f"scale=-2:{height},tile={frames}x1",
+        "-frames:v",
+        "1",
+        "-q:v",
+        "5",
+        output_path,
+    ]
+
+
+class ThumbnailCache(DiskCache):
+    # Keyframe strips addressed by (path, size, mtime), so an edited clip gets a new strip
+    suffix = ".jpg"
+
+    def key_for(self, video_path, signature):
+        return hashlib.blake2b(f"{video_path}|{signature[0]}|{signature[1]}".encode(), digest_size=16).hexdigest()
+
+
+class ThumbnailLoader(QObject):
+    # Builds missing strips on a JobRunner: an ffprobe for the duration when it is not
+    # cached yet, then the strip itself. Only the most recent requests are kept queued;
+    # older ones are for rows that have most likely been scrolled past.
+    # Subclasses build other files per clip by overriding build_command, and can leave
+    # clips out with wants.
+    thumbnailReady = pyqtSignal(str, str)  # Video path, strip path
+    kind = "thumbnail"
+
+    def __init__(self, cache, metadata_cache, runner, frames=4, height=36, max_queued=64, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.metadata_cache = metadata_cache
+        self.runner = runner
+        self.frames = frames
+        self.height = height
+        self.max_queued = max_queued
+        self.requests = {}  # video path -> job of a request in progress
+        self.failed = set()  # Clips that could not be built, or that are not wanted
+
+    def lookup(self, video_path):
+        # (signature, cached strip path or None); only touches the disk, so it can run
+        # on a worker thread. Raises OSError when the clip cannot be read.
+        signature = file_signature(video_path)
+        return signature, self.cache.lookup(self.cache.key_for(video_path, signature), self.cache.suffix)
+
+    def is_requested(self, video_path):
+        # Being built, or it could not be built
+        return video_path in self.requests or video_path in self.failed
+
+    def request(self, video_path, signature=None):
+        # Returns the strip path right away when it is cached; otherwise it is built in
+        # the background and announced with thumbnailReady. With a signature from
+        # lookup() the clip and the cache are not looked at again.
+        if self.is_requested(video_path):
+            return None
+        if signature is None:
+            try:
+                signature, cached = self.lookup(video_path)
+            except OSError:
+                return None
+            if cached is not None:
+                return cached
+        key = self.cache.key_for(video_path, signature)
+        info = self.metadata_cache.lookup(video_path, signature)
+        if info is not None:
+            self.start_strip(video_path, key, info)
+        else:
+            job = FfmpegJob(probe_command(video_path))
+            job.finished.connect(lambda job: self.probe_finished(job, video_path, signature, key))
+            self.submit(video_path, job)
+        return None
+
+    def submit(self, video_path, job):
+        self.requests[video_path] = job
+        self.runner.submit(job)
+        while len(self.runner.queue) > self.max_queued:
+            self.runner.queue[0].cancel()
+
+    def probe_finished(self, job, video_path, signature, key):
+        del self.requests[video_path]
+        if job.cancelled:
+            return
+        info = parse_probe_output(bytes(job.stdout)) if job.succeeded() else None
+        if info is None:
+            self.failed.add(video_path)
+            return
+        self.metadata_cache.store(video_path, info, signature)
+        self.start_strip(video_path, key, info)
+
+    def start_strip(self, video_path, key, info):
+        if not self.wants(info):
+            self.failed.add(video_path)
+            return
+        temp_path = self.cache.temp_path_for(key, self.cache.suffix)
+        job = FfmpegJob(self.build_command(video_path, temp_path, info))
+        job.finished.connect(lambda job: self.strip_finished(job, video_path, key, temp_path))
+        self.submit(video_path, job)
+
+    def wants(self, info):
+        return True
+
+    def build_command(self, video_path, output_path, info):
+        return strip_command(video_path, output_path, info["duration"], self.frames, self.height)
+
+    def strip_finished(self, job, video_path, key, temp_path):
+        del self.requests[video_path]
+        if not job.succeeded():
+            self.cache.discard(temp_path)
+            if not job.cancelled:
+                print(f"Warning: could not build a {self.kind} for {video_path}")
+                self.failed.add(video_path)
+            return
+        self.thumbnailReady.emit(video_path, self.cache.commit(temp_path, key, self.cache.suffix))
+
+    def cancel_all(self):
+        for job in list(self.requests.values()):
+            job.cancel()
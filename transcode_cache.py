@@ -0,0 +1,88 @@
+import hashlib
+from collections import Counter
+
+from disk_cache import DiskCache
+
+
+VIDEO_ENCODERS = {
+    "h264": "libx264",
+    "hevc": "libx265",
+    "mpeg4": "mpeg4",
+    "mpeg2video": "mpeg2video",
+    "vp9": "libvpx-vp9",
+}
+AUDIO_ENCODERS = {
+    "aac": "aac",
+    "mp3": "libmp3lame",
+    "ac3": "ac3",
+    "opus": "libopus",
+    "vorbis": "libvorbis",
+}
+PROFILE_FIELDS = ("codec", "width", "height", "fps", "pix_fmt", "audio_codec", "sample_rate", "channels")
+
+
+def stream_profile(info):
+    # The stream parameters that have to match for "ffmpeg -f concat -c copy" to work
+    profile = {field: info.get(field) for field in PROFILE_FIELDS}
+    profile["fps"] = round(profile["fps"] or 0, 3)
+    return profile
+
+
+def target_profile(infos):
+    # The most common stream layout wins, so most clips can still be stream copied
+    counts = Counter(tuple(sorted(stream_profile(info).items())) for info in infos)
+    if not counts:
+        return None
+    profile = dict(counts.most_common(1)[0][0])
+    if profile["codec"] not in VIDEO_ENCODERS:
+        profile["codec"] = "h264"
+        profile["pix_fmt"] = "yuv420p"
+    if profile["audio_codec"] is not None and profile["audio_codec"] not in AUDIO_ENCODERS:
+        profile["audio_codec"] = "aac"
+    return profile
+
+
+def is_copy_compatible(info, profile):
+    return stream_profile(info) == profile
+
+
+def normalize_command(source_path, output_path, info, profile):
+    width, height = profile["width"], profile["height"]
+    command = ["ffmpeg", "-y", "-v", "error", "-progress", "pipe:1", "-nostats", "-i", source_path]
+    if profile["audio_codec"] is not None and info.get("audio_codec") is None:
+        # Give silent clips a silent track so every clip has the same streams
+        layout = "mono" if profile["channels"] == 1 else "stereo"
+        command += ["-f", "lavfi", "-i", f"anullsrc=r={profile['sample_rate'] or 48000}:cl={layout}"]
+        command += ["-map", "0:v:0", "-map", "1:a:0", "-shortest"]
+    elif profile["audio_codec"] is not None:
+        command += ["-map", "0:v:0", "-map", "0:a:0"]
+    else:
+        command += ["-map", "0:v:0", "-an"]
+
+    video_filter = (
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,"
+        f"fps={profile['fps']},format={profile['pix_fmt']}"
+    )
+    encoder = VIDEO_ENCODERS[profile["codec"]]
+    command += ["-vf", video_filter, "-c:v", encoder]
+    if encoder in ("libx264", "libx265"):
+        command += ["-preset", "veryfast", "-crf", "20"]
+    if profile["audio_codec"] is not None:
+        command += ["-c:a", AUDIO_ENCODERS[profile["audio_codec"]]]
+        if profile["sample_rate"]:
+            command += ["-ar", str(profile["sample_rate"])]
+        if profile["channels"]:
+            command += ["-ac", str(profile["channels"])]
+    command.append(output_path)
+    return command
+
+
+class TranscodeCache(DiskCache):
+    # Normalized copies of clips, addressed by the source content and the target profile,
+    # so a clip is only ever transcoded once per profile no matter where it lives
+    suffix = ".mp4"
+
+    def key_for(self, content_hash, profile):
+        profile_text = ",".join(f"{field}={profile[field]}" for field in PROFILE_FIELDS)
+        return hashlib.blake2b(f"{content_hash}|{profile_text}".encode(), digest_size=16).hexdigest()
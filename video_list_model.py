@@ -0,0 +1,331 @@
+import os
+import math
+from array import array
+from collections import OrderedDict
+from PyQt6.QtCore import (
+    Qt, QAbstractListModel, QModelIndex, QObject, QRunnable, QThreadPool, QTimer, QSortFilterProxyModel,
+    pyqtSignal
+)
+from PyQt6.QtGui import QColor, QPixmap
+
+MOVE_NONE = 0
+MOVE_PENDING = 1
+MOVE_DONE = 2
+MOVE_FAILED = 3
+MOVE_STATE_LABELS = {
+    MOVE_NONE: '',
+    MOVE_PENDING: ' (moving…)',
+    MOVE_DONE: ' (moved)',
+    MOVE_FAILED: ' (move failed)',
+}
+
+# Whether a clip's content has been seen before, going by its content hash
+IDENTITY_NEW = 0
+IDENTITY_KNOWN = 1  # Rated before under another path
+IDENTITY_DUPLICATE = 2  # Same content as an earlier row in the list
+IDENTITY_LABELS = {
+    IDENTITY_NEW: '',
+    IDENTITY_KNOWN: ' (already rated)',
+    IDENTITY_DUPLICATE: ' (duplicate)',
+}
+
+EXISTS_UNKNOWN = -1
+EXISTS_NO = 0
+EXISTS_YES = 1
+
+
+class ExistenceSignals(QObject):
+    checked = pyqtSignal(object, list)  # The check, [(row, path, exists, strip)]
+
+
+class ExistenceCheck(QRunnable):
+    # With a thumbnail lookup the clip's strip is looked up in the same pass: strip is
+    # then (signature, cached strip path or None), so painting a row never touches disk
+    def __init__(self, rows, lookup=None):
+        super().__init__()
+        self.rows = rows  # [(row, path)]
+        self.lookup = lookup
+        self.signals = ExistenceSignals()
+        self.setAutoDelete(False)
+
+    def run(self):
+        results = []
+        for row, path in self.rows:
+            exists = os.path.exists(path)
+            strip = None
+            if exists and self.lookup is not None:
+                try:
+                    strip = self.lookup(path)
+                except OSError:
+                    exists = False
+            results.append((row, path, exists, strip))
+        self.signals.checked.emit(self, results)
+
+
+class VideoListModel(QAbstractListModel):
+    # The ranker's clip list. Per-clip state lives in flat arrays next to the path list,
+    # so a session with 100k clips costs little more than the path strings themselves,
+    # and only the rows a view actually asks for are formatted or checked on disk.
+    def __init__(self, check_radius=50, max_thumbnails=1000, parent=None):
+        super().__init__(parent)
+        self.paths = []
+        self.rows = {}  # path -> row, for duplicate checks and lookups
+        self.ratings = array('b')  # Rating shown for each row, 0 for none
+        self.move_states = array('b')
+        self.exists = array('b')
+        self.identities = array('b')
+        self.errors = {}  # row -> last move error
+
+        # Optional per-clip metrics (e.g. pre-scores), NaN until known
+        self.metrics = {}  # name -> array('f')
+        self.format_metrics = None
+
+        # Existence checks run on a worker thread for the rows around those being shown
+        self.check_radius = check_radius
+        self.check_requests = set()
+        self.checking = set()  # Rows with a check in flight
+        self.checks = []
+        self.check_timer = QTimer(self)
+        self.check_timer.setSingleShot(True)
+        self.check_timer.setInterval(50)
+        self.check_timer.timeout.connect(self.start_existence_check)
+
+        # Thumbnail strips of recently shown rows; others are fetched again on demand
+        self.thumbnail_loader = None
+        self.thumbnails = OrderedDict()  # path -> QPixmap, most recently shown last
+        self.signatures = {}  # path -> signature of checked clips whose strip is not built yet
+        self.max_thumbnails = max_thumbnails
+        self.placeholder = None
+
+    def set_thumbnail_loader(self, loader, size):
+        self.thumbnail_loader = loader
+        loader.thumbnailReady.connect(self.thumbnail_ready)
+        # Rows without a strip yet get an empty one, so every row has the same height
+        self.placeholder = QPixmap(size)
+        self.placeholder.fill(Qt.GlobalColor.transparent)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        row = index.row()
+        if not index.isValid() or row >= len(self.paths):
+            return None
+        if self.exists[row] == EXISTS_UNKNOWN and row not in self.checking and row not in self.check_requests:
+            self.request_existence_check(row)
+        if role == Qt.ItemDataRole.DisplayRole:
+            text = os.path.basename(self.paths[row])
+            if self.ratings[row]:
+                text += ' ' + '★' * self.ratings[row]
+            text += MOVE_STATE_LABELS[self.move_states[row]]
+            text += IDENTITY_LABELS[self.identities[row]]
+            if self.exists[row] == EXISTS_NO and self.move_states[row] != MOVE_PENDING:
+                text += ' (missing)'
+            return text
+        if role == Qt.ItemDataRole.ToolTipRole:
+            if row in self.errors:
+                return self.errors[row]
+            if self.format_metrics is not None and self.has_metrics(row):
+                return self.paths[row] + '\n' + self.format_metrics(self.row_metrics(row))
+            return self.paths[row]
+        if role == Qt.ItemDataRole.ForegroundRole and self.exists[row] == EXISTS_NO:
+            return QColor(Qt.GlobalColor.gray)
+        if role == Qt.ItemDataRole.DecorationRole and self.thumbnail_loader is not None:
+            return self.thumbnail(row)
+        return None
+
+    def thumbnail(self, row):
+        path = self.paths[row]
+        pixmap = self.thumbnails.get(path)
+        if pixmap is not None:
+            self.thumbnails.move_to_end(path)
+            return pixmap
+        # Clips on a share are only looked at by the existence checks, never while painting
+        if self.exists[row] != EXISTS_YES or self.thumbnail_loader.is_requested(path):
+            return self.placeholder
+        signature = self.signatures.pop(path, None)
+        if signature is not None:
+            self.thumbnail_loader.request(path, signature)
+        elif row not in self.checking:
+            # Dropped from memory since it was checked: look for its strip again
+            self.check_requests.add(row)
+            if not self.check_timer.isActive():
+                self.check_timer.start()
+        return self.placeholder
+
+    def add_thumbnail(self, path, strip_path):
+        pixmap = QPixmap(strip_path)
+        if pixmap.isNull():
+            return self.placeholder
+        self.thumbnails[path] = pixmap
+        while len(self.thumbnails) > self.max_thumbnails:
+            self.thumbnails.popitem(last=False)
+        return pixmap
+
+    def thumbnail_ready(self, path, strip_path):
+        row = self.rows.get(path)
+        if row is not None:
+            self.add_thumbnail(path, strip_path)
+            self.row_changed(row)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def path(self, row):
+        return self.paths[row]
+
+    def contains(self, path):
+        return path in self.rows
+
+    def add_paths(self, paths, ratings, exists=EXISTS_UNKNOWN):
+        # Appends the paths that are not in the list yet and returns them;
+        # ratings maps path -> rating
+        new_paths = []
+        for path in paths:
+            if path not in self.rows:
+                self.rows[path] = len(self.paths) + len(new_paths)
+                new_paths.append(path)
+        if not new_paths:
+            return new_paths
+        start = len(self.paths)
+        self.beginInsertRows(QModelIndex(), start, start + len(new_paths) - 1)
+        self.paths.extend(new_paths)
+        self.ratings.extend(ratings.get(path) or 0 for path in new_paths)
+        self.move_states.extend([MOVE_NONE] * len(new_paths))
+        self.exists.extend([exists] * len(new_paths))
+        self.identities.extend([IDENTITY_NEW] * len(new_paths))
+        for values in self.metrics.values():
+            values.extend([math.nan] * len(new_paths))
+        self.endInsertRows()
+        return new_paths
+
+    def set_path(self, row, path):
+        del self.rows[self.paths[row]]
+        self.signatures.pop(self.paths[row], None)
+        self.rows[path] = row
+        self.paths[row] = path
+        self.exists[row] = EXISTS_UNKNOWN
+        self.row_changed(row)
+
+    def rating(self, row):
+        return self.ratings[row]
+
+    def set_rating(self, row, rating):
+        self.ratings[row] = rating or 0
+        self.row_changed(row)
+
+    def set_metric_fields(self, fields, format_metrics=None):
+        self.metrics = {field: array('f', [math.nan]) * len(self.paths) for field in fields}
+        self.format_metrics = format_metrics
+
+    def metric(self, row, field):
+        return self.metrics[field][row]
+
+    def has_metrics(self, row):
+        return any(not math.isnan(values[row]) for values in self.metrics.values())
+
+    def row_metrics(self, row):
+        return {field: values[row] for field, values in self.metrics.items()}
+
+    def set_metrics(self, row, metrics):
+        for field, values in self.metrics.items():
+            values[row] = metrics[field]
+        self.row_changed(row)
+
+    def identity(self, row):
+        return self.identities[row]
+
+    def set_identity(self, row, identity):
+        self.identities[row] = identity
+        self.row_changed(row)
+
+    def set_move_state(self, row, state, error=None):
+        self.move_states[row] = state
+        if error:
+            self.errors[row] = error
+        else:
+            self.errors.pop(row, None)
+        self.row_changed(row)
+
+    def row_changed(self, row):
+        index = self.index(row)
+        self.dataChanged.emit(index, index)
+
+    def request_existence_check(self, row):
+        start = max(0, row - self.check_radius)
+        end = min(len(self.paths), row + self.check_radius + 1)
+        self.check_requests.update(
+            r for r in range(start, end) if self.exists[r] == EXISTS_UNKNOWN and r not in self.checking
+        )
+        if not self.check_timer.isActive():
+            self.check_timer.start()
+
+    def start_existence_check(self):
+        if not self.check_requests:
+            return
+        rows = [(row, self.paths[row]) for row in sorted(self.check_requests)]
+        self.checking.update(self.check_requests)
+        self.check_requests.clear()
+        check = ExistenceCheck(rows, self.thumbnail_loader.lookup if self.thumbnail_loader is not None else None)
+        check.signals.checked.connect(self.existence_checked)
+        self.checks.append(check)
+        QThreadPool.globalInstance().start(check)
+
+    def existence_checked(self, check, results):
+        self.checks.remove(check)
+        for row, path, exists, strip in results:
+            self.checking.discard(row)
+            # The clip may have been moved while it was being checked
+            if row < len(self.paths) and self.paths[row] == path:
+                if not exists and self.exists[row] != EXISTS_NO:
+                    print(f"Warning: {path} does not exist")
+                self.exists[row] = EXISTS_YES if exists else EXISTS_NO
+                if strip is not None:
+                    signature, strip_path = strip
+                    if strip_path is not None:
+                        self.add_thumbnail(path, strip_path)
+                    else:
+                        self.signatures[path] = signature
+        if results:
+            self.dataChanged.emit(self.index(results[0][0]), self.index(results[-1][0]))
+
+
+class VideoSortFilterModel(QSortFilterProxyModel):
+    # Queue order for the ranker: drop order, or sorted by one of the source model's
+    # metrics, optionally hiding clips that are mostly black or frozen. Sorting only
+    # happens on request, so rows do not jump around while metrics come in.
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setDynamicSortFilter(False)
+        self.sort_field = None
+        self.sort_descending = True
+        self.hidden = {}  # metric -> rows with a value above this are hidden
+
+    def sort_by(self, field, descending=True):
+        self.sort_field = field
+        self.sort_descending = descending
+        if field is None:
+            self.sort(-1)  # Back to the source (drop) order
+        else:
+            self.invalidate()
+            self.sort(0, Qt.SortOrder.AscendingOrder)
+
+    def set_hidden(self, thresholds):
+        self.hidden = dict(thresholds)
+        self.invalidateFilter()
+
+    def sort_key(self, row):
+        value = self.sourceModel().metric(row, self.sort_field)
+        if math.isnan(value):
+            return math.inf  # Clips that have not been scored yet go last
+        return -value if self.sort_descending else value
+
+    def lessThan(self, left, right):
+        return self.sort_key(left.row()) < self.sort_key(right.row())
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        model = self.sourceModel()
+        for field, threshold in self.hidden.items():
+            if model.metric(source_row, field) > threshold:
+                return False
+        return True
@@ -1,6 +1,10 @@
 import sys
 import os
-import subprocess
+import argparse
+import bisect
+import math
+from collections import deque
+import json
 from PyQt6.QtWidgets import (
     QApplication,
     QMainWindow,
@@ -8,30 +12,434 @@ from PyQt6.QtWidgets import (
     QGraphicsScene,
     QGraphicsTextItem,
     QGraphicsRectItem,
+    QGraphicsItem,
 )
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
 from PyQt6.QtMultimediaWidgets import QGraphicsVideoItem
-from PyQt6.QtCore import QUrl, Qt, QRectF, QTimer
-from PyQt6.QtGui import QFont, QColor
+from PyQt6.QtCore import QUrl, Qt, QRectF, QTimer, QObject, QEvent, pyqtSignal
+from PyQt6.QtGui import QFont, QColor, QPen
+
+from metadata_cache import (
+    MetadataCache,
+    file_signature,
+    probe_command,
+    parse_probe_output,
+)
+from ffmpeg_jobs import FfmpegJob, JobRunner
+from hls_stream import HlsStream
+from transcode_cache import TranscodeCache, target_profile, is_copy_compatible, normalize_command
+from folder_watcher import FolderWatcher
+from content_index import ContentIndex
+from proxy_cache import ProxyCache, ProxyLoader, proxy_profile
+from metrics import metrics, frame_near
+
+METADATA_CACHE_NAME = ".video_metadata.db"
+TRANSCODE_CACHE_NAME = ".normalized"
+STREAM_DIR_NAME = ".stream"
+PROXY_CACHE_NAME = ".proxies"
+PROXY_LOOKAHEAD = 3  # Clips after the current one to build proxies for
+WALL_PROXY_CACHE_NAME = ".wall_proxies"
+WALL_PROXY_HEIGHT = 360
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".wmv")
+
+
+def is_clip_file(filename):
+    return (
+        filename.lower().endswith(VIDEO_EXTENSIONS)
+        and not filename.startswith("concatenated_video_")  # Exclude concatenated videos
+    )
+
+
+class PlaylistEngine(QObject):
+    # Plays a list of clips back to back without concatenating them. The next clip is
+    # kept loaded and paused in a standby player and swapped in at end of media.
+    # resolve maps a clip to the file that is actually played, e.g. its proxy.
+    positionChanged = pyqtSignal(int)  # Elapsed milliseconds within the whole playlist
+    clipChanged = pyqtSignal(int)
+
+    def __init__(self, scene, resolve=None, parent=None):
+        super().__init__(parent)
+        self.resolve = resolve or (lambda path: path)
+        self.paths = []
+        self.cumulative_durations = [0]
+        self.current_clip = -1
+        # The playing clip was removed from the playlist; current_clip is then the clip
+        # that took its place, which plays next
+        self.current_removed = False
+        self.slots = []
+        for _ in range(2):
+            player = QMediaPlayer()
+            audio_output = QAudioOutput()
+            player.setAudioOutput(audio_output)
+            video_item = QGraphicsVideoItem()
+            video_item.setVisible(False)
+            scene.addItem(video_item)
+            player.setVideoOutput(video_item)
+            slot = {"player": player, "audio_output": audio_output, "video_item": video_item, "path": None}
+            player.positionChanged.connect(lambda position, slot=slot: self.slot_position_changed(slot, position))
+            player.mediaStatusChanged.connect(lambda status, slot=slot: self.slot_media_status_changed(slot, status))
+            if metrics.enabled:
+                video_item.videoSink().videoFrameChanged.connect(lambda frame, slot=slot: self.frame_shown(slot))
+            self.slots.append(slot)
+        self.active_slot = 0
+
+    def active(self):
+        return self.slots[self.active_slot]
+
+    def standby(self):
+        return self.slots[1 - self.active_slot]
+
+    def set_playlist(self, paths, cumulative_durations):
+        old_paths = self.paths
+        self.paths = list(paths)
+        self.cumulative_durations = list(cumulative_durations)
+        if self.current_clip < 0:
+            return
+        # Keep playing the same clip; if it was removed, carry on after the last clip
+        # before it that is still there
+        current_path = self.active()["path"]
+        if current_path in self.paths:
+            self.current_clip = self.paths.index(current_path)
+            self.current_removed = False
+        else:
+            present = set(self.paths)
+            previous = next((path for path in reversed(old_paths[:self.current_clip]) if path in present), None)
+            self.current_clip = self.paths.index(previous) + 1 if previous is not None else 0
+            self.current_removed = True
+        if self.paths:
+            self.preload(self.next_clip_index())
+
+    def is_playing(self):
+        return self.active()["player"].playbackState() == QMediaPlayer.PlaybackState.PlayingState
+
+    def next_clip_index(self):
+        if not self.paths:
+            return -1
+        if self.current_removed:
+            return self.current_clip % len(self.paths)
+        return (self.current_clip + 1) % len(self.paths)
+
+    def load(self, slot, path):
+        if slot["path"] != path:
+            slot["path"] = path
+            playback_path = self.resolve(path)
+            metrics.start("ttff_seconds", id(slot), mode="playlist", proxy=str(playback_path != path).lower())
+            slot["player"].setSource(QUrl.fromLocalFile(playback_path))
+        slot["player"].pause()  # Decode the first frame and hold it
+
+    def preload(self, clip_index):
+        if clip_index >= 0:
+            self.load(self.standby(), self.paths[clip_index])
+
+    def play(self, clip_index=0):
+        if not self.paths:
+            return
+        self.cue(clip_index)
+        self.active()["player"].play()
+
+    def cue(self, clip_index):
+        # Show the first frame of a clip without starting it
+        if not self.paths:
+            return
+        self.current_clip = clip_index
+        self.current_removed = False
+        slot = self.active()
+        self.load(slot, self.paths[clip_index])
+        slot["player"].setPosition(0)
+        slot["video_item"].setVisible(True)
+        self.standby()["video_item"].setVisible(False)
+        self.clipChanged.emit(clip_index)
+        self.preload(self.next_clip_index())
+
+    def pause(self):
+        # Hold the frame on screen; a playlist that has not started shows its first frame
+        if self.current_clip < 0:
+            self.cue(0)
+        else:
+            self.active()["player"].pause()
+
+    def resume(self):
+        if self.current_clip < 0:
+            self.play(0)
+        elif self.paths:
+            self.active()["player"].play()
+
+    def reload(self):
+        # Load the current and the next clip again, e.g. after resolve has changed its
+        # mind about them, continuing from the same position
+        if self.current_removed or not 0 <= self.current_clip < len(self.paths):
+            return
+        slot = self.active()
+        playing = self.is_playing()
+        position = slot["player"].position()
+        slot["path"] = None
+        self.standby()["path"] = None
+        self.load(slot, self.paths[self.current_clip])
+        slot["player"].setPosition(position)
+        if playing:
+            slot["player"].play()
+        self.preload(self.next_clip_index())
+
+    def set_muted(self, muted):
+        for slot in self.slots:
+            slot["audio_output"].setMuted(muted)
+
+    def advance(self):
+        next_clip = self.next_clip_index()
+        if next_clip < 0:
+            return
+        metrics.start("clip_switch_seconds")
+        next_path = self.paths[next_clip]
+        previous = self.active()
+        if self.standby()["path"] == next_path:
+            self.active_slot = 1 - self.active_slot
+        previous["player"].stop()
+        self.play(next_clip)
+
+    def slot_position_changed(self, slot, position):
+        # A removed clip counts from the start of the clip that took its place
+        if slot is self.active() and 0 <= self.current_clip < len(self.cumulative_durations):
+            self.positionChanged.emit(int(self.cumulative_durations[self.current_clip] + position))
+
+    def frame_shown(self, slot):
+        # Only connected when metrics are enabled
+        metrics.stop("ttff_seconds", id(slot))
+        if slot is self.active():
+            metrics.stop("clip_switch_seconds")
+
+    def slot_media_status_changed(self, slot, status):
+        if slot is not self.active():
+            return
+        if status in (QMediaPlayer.MediaStatus.EndOfMedia, QMediaPlayer.MediaStatus.InvalidMedia):
+            self.advance()
+
+    def setSize(self, size):
+        for slot in self.slots:
+            slot["video_item"].setSize(size)
+
+    def setPos(self, x, y):
+        for slot in self.slots:
+            slot["video_item"].setPos(x, y)
+
+
+def format_timecode(milliseconds, fps):
+    # Convert to timecode format (HH:MM:SS:FF)
+    hours, remainder = divmod(milliseconds // 1000, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    frames = int((milliseconds % 1000) * fps / 1000)
+    return f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}:{int(frames):02d}"
+
+
+class PlaybackOverlay:
+    # Timecode and clip counter drawn over the video. Updates are cheap enough to run
+    # on every positionChanged: the clip is found with a bisect, the total is formatted
+    # once per timeline, and scene items are only touched when the visible text changes.
+    def __init__(self, scene, fps=25, timecode_size=24, clip_number_size=14):
+        self.fps = fps
+        self.cumulative_durations = [0]
+        self.clip_count = 0
+        self.total_text = format_timecode(0, fps)
+        self.last_frame = None
+        self.last_clip_index = None
+        self.area = QRectF()
+
+        # Create text items for timecode and clip number
+        self.timecode_item = self.create_text_item(scene, timecode_size)
+        self.clip_number_item = self.create_text_item(scene, clip_number_size)
+
+        # Create background rectangles for text items
+        self.timecode_bg = self.create_background(scene)
+        self.clip_number_bg = self.create_background(scene)
+
+        # Background rects only change when the text length does (monospace font)
+        self.timecode_length = None
+        self.clip_number_length = None
+
+    def create_text_item(self, scene, size):
+        font = QFont("Courier", size)
+        font.setStyleHint(QFont.StyleHint.Monospace)
+        item = QGraphicsTextItem()
+        item.setDefaultTextColor(QColor("white"))
+        item.setFont(font)
+        item.setZValue(1)  # Ensure it's above the video
+        scene.addItem(item)
+        return item
+
+    def create_background(self, scene):
+        background = QGraphicsRectItem()
+        background.setBrush(QColor(0, 0, 0, 128))  # Semi-transparent black
+        background.setZValue(0.5)  # Behind the text items
+        scene.addItem(background)
+        return background
+
+    def set_timeline(self, cumulative_durations, total_time):
+        self.cumulative_durations = cumulative_durations
+        self.clip_count = len(cumulative_durations) - 1
+        self.total_text = format_timecode(total_time, self.fps)
+        # Force both labels to refresh on the next position update
+        self.last_frame = None
+        self.last_clip_index = None
+
+    def update_position(self, position):
+        if not self.timecode_item.isVisible():
+            return
+        # Only reformat when the displayed frame changes
+        frame = position * self.fps // 1000
+        if frame != self.last_frame:
+            self.last_frame = frame
+            self.set_timecode_text(format_timecode(position, self.fps) + "/" + self.total_text)
+
+        clip_index = bisect.bisect_right(self.cumulative_durations, position) - 1
+        clip_index = max(0, min(clip_index, self.clip_count - 1))
+        if clip_index != self.last_clip_index:
+            self.last_clip_index = clip_index
+            self.set_clip_number_text(f"{clip_index + 1} / {self.clip_count}")
+
+    def set_timecode_text(self, text):
+        self.timecode_item.setPlainText(text)
+        if len(text) != self.timecode_length:
+            self.timecode_length = len(text)
+            self.layout_timecode()
+
+    def set_clip_number_text(self, text):
+        self.clip_number_item.setPlainText(text)
+        if len(text) != self.clip_number_length:
+            self.clip_number_length = len(text)
+            self.layout_clip_number()
+
+    def layout(self, area):
+        self.area = QRectF(area)
+        self.layout_timecode()
+        self.layout_clip_number()
+
+    def layout_timecode(self):
+        # Position the timecode at bottom center
+        rect = self.timecode_item.boundingRect()
+        self.timecode_item.setPos(
+            self.area.x() + (self.area.width() - rect.width()) / 2,
+            self.area.y() + self.area.height() - rect.height() - 20,
+        )
+        self.timecode_bg.setRect(self.timecode_item.x(), self.timecode_item.y(), rect.width(), rect.height())
+
+    def layout_clip_number(self):
+        # Position the clip number at top right
+        rect = self.clip_number_item.boundingRect()
+        self.clip_number_item.setPos(self.area.x() + self.area.width() - rect.width() - 100, self.area.y() + 20)
+        self.clip_number_bg.setRect(self.clip_number_item.x(), self.clip_number_item.y(), rect.width(), rect.height())
+
+    def is_visible(self):
+        return self.timecode_item.isVisible()
+
+    def set_visible(self, visible):
+        for item in (self.timecode_item, self.timecode_bg, self.clip_number_item, self.clip_number_bg):
+            item.setVisible(visible)
+        self.last_frame = None
+        self.last_clip_index = None
 
 
 class VideoPlayer(QMainWindow):
-    def __init__(self, folder_path):
+    def __init__(self, folder_path, mode="concat", incremental=False, normalize=True, normalize_cache_bytes=20 << 30,
+                 proxies=False, proxy_cache_bytes=20 << 30, settle_ms=2000):
         super().__init__()
         self.folder_path = folder_path
+        # "concat" plays an ffmpeg-concatenated copy of the folder, "playlist"
+        # plays the clips directly through a gapless PlaylistEngine and "stream"
+        # plays a growing HLS stream that starts as soon as the first clip is segmented
+        self.mode = mode
+        self.engine = None
+        # In incremental mode the concatenated videos are MPEG-TS files that only
+        # get the newly arrived clips appended instead of being rebuilt every loop
+        self.incremental = incremental
 
         # Initialize variables
         self.playlist = []
+        self.clip_info = []
         self.clip_durations = []
         self.cumulative_durations = []
         self.total_time = 0  # in milliseconds
         self.fps = 25  # Frames per second for timecode calculation
 
+        # Probe results are cached next to the clips so rescans only probe new files
+        self.metadata_cache = MetadataCache(os.path.join(folder_path, METADATA_CACHE_NAME))
+
         # Flag to alternate between concatenated videos
         self.current_video_index = 0  # 0 or 1
 
-        # Load the initial playlist and clip durations
-        self.load_playlist()
+        # Every ffmpeg/ffprobe run goes through a job runner so nothing blocks the UI
+        self.probe_runner = JobRunner(max_concurrent=4, name="probe", parent=self)
+        self.build_runner = JobRunner(max_concurrent=1, name="build", parent=self)
+        self.build = None  # Concatenated video currently being built
+        self.rebuild_requested = False
+        self.ready_video_index = None  # Verified video waiting for the next loop
+        self.rebuild_timer = QTimer(self)
+        self.rebuild_timer.setSingleShot(True)
+        self.rebuild_timer.setInterval(1000)
+        self.rebuild_timer.timeout.connect(self.refresh_output)
+
+        # Timeline of what is on screen, which lags the playlist while a rebuild runs
+        self.timeline = {"cumulative_durations": [0], "total_time": 0}
+        self.timelines = {}
+
+        # Clips that cannot be stream copied into the concatenated video are transcoded
+        # once, in the background, into a content-addressed cache
+        self.normalize = normalize
+        self.transcode_cache = None
+        self.content_index = None
+        if normalize and mode in ("concat", "stream"):
+            self.transcode_cache = TranscodeCache(
+                os.path.join(folder_path, TRANSCODE_CACHE_NAME), normalize_cache_bytes
+            )
+            # Transcodes are addressed by content hash; files are read for it on the
+            # index's thread pool, never while a build is being set up
+            self.content_index = ContentIndex(os.path.join(folder_path, METADATA_CACHE_NAME), parent=self)
+            self.content_index.hashed.connect(self.clips_hashed)
+        self.transcode_runner = JobRunner(max_concurrent=2, name="transcode", parent=self)
+        self.transcodes = {}  # cache key -> running FfmpegJob
+        self.failed_transcodes = set()
+        self.hashing = set()  # Clips waiting for their content hash
+
+        # Low-res proxies for playback. The playlist engine plays each heavy clip's proxy
+        # once it has been built; the concatenated video is built from clips normalized
+        # to a proxy-sized profile instead of the full-size one.
+        self.proxies = proxies
+        self.proxy_loader = None
+        if proxies and mode == "playlist":
+            self.proxy_loader = ProxyLoader(
+                ProxyCache(os.path.join(folder_path, PROXY_CACHE_NAME), proxy_cache_bytes),
+                self.metadata_cache,
+                JobRunner(max_concurrent=1, name="proxies", parent=self),
+                max_queued=256,
+                parent=self,
+            )
+        elif proxies and self.transcode_cache is None:
+            print("Warning: proxies need normalization in concat and stream modes, playing the originals")
+
+        self.stream = None
+        if mode == "stream":
+            self.stream = HlsStream(os.path.join(folder_path, STREAM_DIR_NAME), self.build_runner, parent=self)
+            self.stream.segmentsAdded.connect(self.stream_grew)
+            self.stream.streamReset.connect(self.stream_reset)
+
+        # The watcher reports complete files as they arrive or disappear, so the
+        # playlist is updated incrementally instead of rescanning the folder
+        self.pending_added = set()
+        self.pending_removed = set()
+        # Every file is seen twice, settle_ms apart, before it is played; at startup too
+        self.watcher = FolderWatcher(folder_path, accept=self.is_playlist_file, settle_ms=settle_ms, parent=self)
+        self.watcher.filesAdded.connect(self.files_added)
+        self.watcher.filesRemoved.connect(self.files_removed)
+        self.watcher.ready.connect(self.load_playlist)
+
+        # Resume the clip order of the most recent incremental build, so the
+        # existing output stays a prefix of the playlist across restarts
+        if self.incremental:
+            manifests = [self.load_manifest(index) for index in (0, 1)]
+            newest = max(manifests, key=len)
+            self.playlist = [entry[0] for entry in newest]
+
+        # Load the initial playlist and clip durations once the watcher has checked
+        # the files that are already there
+        self.watcher.start()
 
         # Create the graphics scene and view
         self.scene = QGraphicsScene()
@@ -43,89 +451,343 @@ class VideoPlayer(QMainWindow):
         # Set the central widget
         self.setCentralWidget(self.view)
 
-        # Create the video item
-        self.video_item = QGraphicsVideoItem()
-        self.scene.addItem(self.video_item)
-
-        # Create text items for timecode and clip number
-        self.timecode_item = QGraphicsTextItem()
-        self.timecode_item.setDefaultTextColor(QColor("white"))
-        self.timecode_item.setFont(QFont("Courier", 24))
-        self.timecode_item.setZValue(1)  # Ensure it's above the video
-        self.scene.addItem(self.timecode_item)
-
-        self.clip_number_item = QGraphicsTextItem()
-        self.clip_number_item.setDefaultTextColor(QColor("white"))
-        self.clip_number_item.setFont(QFont("Courier", 14))
-        self.clip_number_item.setZValue(1)
-        self.scene.addItem(self.clip_number_item)
+        # Timecode and clip counter overlay
+        self.overlay = PlaybackOverlay(self.scene, fps=self.fps)
 
-        # Create background rectangles for text items
-        self.timecode_bg = QGraphicsRectItem()
-        self.timecode_bg.setBrush(QColor(0, 0, 0, 128))  # Semi-transparent black
-        self.timecode_bg.setZValue(0.5)  # Behind the text items
-        self.scene.addItem(self.timecode_bg)
-
-        self.clip_number_bg = QGraphicsRectItem()
-        self.clip_number_bg.setBrush(QColor(0, 0, 0, 128))
-        self.clip_number_bg.setZValue(0.5)
-        self.scene.addItem(self.clip_number_bg)
+        if self.mode == "playlist":
+            self.engine = PlaylistEngine(self.scene, resolve=self.playback_path, parent=self)
+            self.engine.positionChanged.connect(self.update_overlays)
+            if self.proxy_loader is not None:
+                self.engine.clipChanged.connect(self.request_proxies)
+            self.update_engine_playlist()
+        else:
+            # Create the video item
+            self.video_item = QGraphicsVideoItem()
+            self.scene.addItem(self.video_item)
 
-        # Create media player
-        self.current_player = QMediaPlayer()
-        self.audio_output = QAudioOutput()
-        self.current_player.setAudioOutput(self.audio_output)
+        if self.mode in ("concat", "stream"):
+            # Create media player
+            self.current_player = QMediaPlayer()
+            self.audio_output = QAudioOutput()
+            self.current_player.setAudioOutput(self.audio_output)
 
-        # Set the video output to the video item
-        self.current_player.setVideoOutput(self.video_item)
+            # Set the video output to the video item
+            self.current_player.setVideoOutput(self.video_item)
 
-        # Connect signals for the current player
-        self.current_player.positionChanged.connect(self.update_overlays)
-        self.current_player.mediaStatusChanged.connect(self.media_status_changed)
+            # Connect signals for the current player
+            self.current_player.positionChanged.connect(self.update_overlays)
+            self.current_player.mediaStatusChanged.connect(self.media_status_changed)
+            if metrics.enabled:
+                self.video_item.videoSink().videoFrameChanged.connect(self.frame_shown)
 
         # Start playing the video
         self.play_video()
 
+    def is_playlist_file(self, filename):
+        return is_clip_file(filename)
+
     def load_playlist(self):
-        # Get list of video files in folder, sorted alphabetically
-        files = os.listdir(self.folder_path)
-        video_files = [
-            f
-            for f in files
-            if f.lower().endswith((".mp4", ".avi", ".mov", ".mkv", ".wmv"))
-            and not f.startswith("concatenated_video_")  # Exclude concatenated videos
-        ]
-        video_files.sort()
-        self.playlist = video_files
+        # Probe anything missing from the metadata cache in the background, then build
+        self.probe_files(self.watcher.files(), self.build_playlist)
+
+    def build_playlist(self, names):
+        # Use the complete video files reported by the watcher, sorted alphabetically
+        video_files = sorted(names)
+        if self.incremental:
+            # Keep the previous order and append newly arrived clips at the end
+            present = set(video_files)
+            known = [f for f in self.playlist if f in present]
+            known_set = set(known)
+            video_files = known + [f for f in video_files if f not in known_set]
+        self.playlist = []
+        self.clip_info = []
         self.clip_durations = []
-        for video_file in self.playlist:
+        for video_file in video_files:
             video_path = os.path.join(self.folder_path, video_file)
-            duration = self.get_video_duration(video_path)
-            self.clip_durations.append(duration)
+            info = self.metadata_cache.lookup(video_path)
+            if info is None:
+                print(f"Warning: could not probe {video_path}, skipping")
+                continue
+            self.playlist.append(video_file)
+            self.clip_info.append(info)
+            self.clip_durations.append(info["duration"] * 1000)  # Convert to milliseconds
+        self.metadata_cache.prune(
+            {os.path.join(self.folder_path, f) for f in self.playlist},
+            prefix=os.path.join(self.folder_path, ""),
+        )
+        self.update_cumulative_durations()
+        self.playlist_changed()
+
+    def probe_files(self, names, callback):
+        # Run ffprobe for files that are not in the metadata cache yet, then call back
+        missing = [
+            name for name in names
+            if self.metadata_cache.lookup(os.path.join(self.folder_path, name)) is None
+        ]
+        if not missing:
+            callback(names)
+            return
+        remaining = set(missing)
+
+        def probe_finished(job, name):
+            video_path = os.path.join(self.folder_path, name)
+            info = parse_probe_output(bytes(job.stdout)) if job.succeeded() else None
+            if info is not None:
+                try:
+                    self.metadata_cache.store(video_path, info)
+                except OSError:
+                    pass  # Removed while it was being probed
+            remaining.discard(name)
+            if not remaining:
+                callback(names)
+
+        for name in missing:
+            job = FfmpegJob(probe_command(os.path.join(self.folder_path, name)))
+            job.finished.connect(lambda job, name=name: probe_finished(job, name))
+            self.probe_runner.submit(job)
+
+    def update_cumulative_durations(self):
         # Compute cumulative durations
         self.cumulative_durations = [0]
         for duration in self.clip_durations:
             self.cumulative_durations.append(self.cumulative_durations[-1] + duration)
         self.total_time = self.cumulative_durations[-1]
-        # Create the concatenated video
-        self.create_concatenated_video()
+
+    def snapshot_timeline(self, durations=None):
+        if durations is None:
+            return {
+                "cumulative_durations": list(self.cumulative_durations),
+                "total_time": self.total_time,
+            }
+        cumulative_durations = [0]
+        for duration in durations:
+            cumulative_durations.append(cumulative_durations[-1] + duration)
+        return {"cumulative_durations": cumulative_durations, "total_time": cumulative_durations[-1]}
+
+    def playlist_changed(self):
+        if self.mode in ("concat", "stream"):
+            # Coalesce bursts of arrivals into one rebuild
+            self.rebuild_timer.start()
+        elif self.engine is not None:
+            self.update_engine_playlist()
+
+    def files_added(self, names):
+        metrics.count("ingested_clips_total", len(names))
+        self.probe_files(names, self.clips_probed)
+
+    def clips_probed(self, names):
+        # Ignore files that disappeared while they were being probed
+        known = set(self.watcher.files())
+        self.pending_added.update(name for name in names if name in known)
+        self.apply_pending_changes()
+
+    def files_removed(self, names):
+        self.hashing.difference_update(os.path.join(self.folder_path, name) for name in names)
+        self.pending_added.difference_update(names)
+        self.pending_removed.update(names)
+        self.apply_pending_changes()
+
+    def apply_pending_changes(self):
+        # Fold the watcher's add/remove events into the playlist without a rescan.
+        # Re-added names are files that changed in place and replace their old entry.
+        removed = self.pending_removed | (self.pending_added & set(self.playlist))
+        if removed:
+            keep = [i for i, f in enumerate(self.playlist) if f not in removed]
+            self.playlist = [self.playlist[i] for i in keep]
+            self.clip_info = [self.clip_info[i] for i in keep]
+            self.clip_durations = [self.clip_durations[i] for i in keep]
+            self.metadata_cache.prune(
+                {os.path.join(self.folder_path, f) for f in self.playlist},
+                prefix=os.path.join(self.folder_path, ""),
+            )
+        for video_file in sorted(self.pending_added):
+            video_path = os.path.join(self.folder_path, video_file)
+            info = self.metadata_cache.lookup(video_path)
+            if info is None:
+                print(f"Warning: could not probe {video_path}, skipping")
+                continue
+            if self.incremental:
+                index = len(self.playlist)
+            else:
+                index = bisect.bisect(self.playlist, video_file)
+            self.playlist.insert(index, video_file)
+            self.clip_info.insert(index, info)
+            self.clip_durations.insert(index, info["duration"] * 1000)
+        self.pending_added = set()
+        self.pending_removed = set()
+        self.update_cumulative_durations()
+        self.playlist_changed()
+
+    def playback_path(self, video_path):
+        if self.proxy_loader is None:
+            return video_path
+        return self.proxy_loader.playback_path(video_path)
+
+    def update_engine_playlist(self):
+        paths = [os.path.join(self.folder_path, f) for f in self.playlist]
+        self.engine.set_playlist(paths, self.cumulative_durations)
+        self.set_timeline(self.snapshot_timeline())
+        if not self.engine.is_playing():
+            self.engine.play(0)
+        elif self.proxy_loader is not None:
+            self.request_proxies(self.engine.current_clip)
+
+    def request_proxies(self, clip_index):
+        # Only the clips coming up are queued, so the loader's bounded queue never drops
+        # them for clips that are far away; resolve covers the clip being loaded. Each
+        # clip picks its proxy up the next time it loads.
+        paths = self.engine.paths
+        for offset in range(1, min(PROXY_LOOKAHEAD, len(paths) - 1) + 1):
+            self.proxy_loader.request(paths[(clip_index + offset) % len(paths)])
+
+    def refresh_output(self):
+        if self.stream is not None:
+            self.stream.update(self.concat_inputs())
+        else:
+            self.create_concatenated_video()
+
+    def stream_grew(self):
+        self.set_timeline(self.stream.timeline())
+        if self.current_player.playbackState() == QMediaPlayer.PlaybackState.StoppedState:
+            self.play_video()
+
+    def stream_reset(self):
+        self.current_player.stop()
+        self.current_player.setSource(QUrl())
+
+    def restart_stream(self):
+        # Loop by loading the playlist again rather than seeking: it picks up clips
+        # published since it was last loaded, and a live playlist cannot be seeked in
+        metrics.start("seek_seconds", "main", mode=self.mode)
+        self.current_player.setSource(QUrl())
+        self.current_player.setSource(QUrl.fromLocalFile(self.stream.playlist_path()))
+        self.current_player.play()
+
+    def concatenated_video_name(self, index):
+        extension = "ts" if self.incremental else "mp4"
+        return f"concatenated_video_{index}.{extension}"
 
     def create_concatenated_video(self):
-        # Alternate between two video files
-        self.current_video_index = 1 - self.current_video_index  # Switch between 0 and 1
-        concatenated_video_name = f"concatenated_video_{self.current_video_index}.mp4"
-        self.concatenated_video_path = os.path.join(self.folder_path, concatenated_video_name)
+        # Build the next concatenated video in the background; the one on screen keeps
+        # looping until the new one has been written and verified
+        if self.build is not None:
+            self.build["cancelled"] = True
+            if self.build["job"] is not None and self.build["job"].is_running():
+                # Wait for the killed ffmpeg to exit before touching the same file again
+                self.rebuild_requested = True
+                self.build["job"].cancel()
+                return
+            if self.build["job"] is not None:
+                self.build["job"].cancel()
+        self.build = None
+        self.rebuild_requested = False
+        inputs = self.concat_inputs()
+        if not inputs:
+            return
+
+        # Never write to the video that is on screen
+        index = 1 - self.current_video_index
+        if self.ready_video_index == index:
+            self.ready_video_index = None
+        video_path = os.path.join(self.folder_path, self.concatenated_video_name(index))
+        timeline = self.snapshot_timeline([duration for _, _, duration in inputs])
+        if self.incremental:
+            steps = self.incremental_steps(index, video_path, inputs, timeline)
+            if steps is None:
+                # Try again once the watcher has taken the clip out of the playlist
+                self.rebuild_timer.start()
+                return
+        else:
+            steps = [self.concat_step(index, video_path, inputs, timeline)]
+        self.build = {
+            "index": index,
+            "path": video_path,
+            "steps": deque(steps),
+            "timeline": timeline,
+            "job": None,
+            "cancelled": False,
+            "verifying": False,
+        }
+        metrics.start("concat_build_seconds", incremental=str(self.incremental).lower())
+        self.start_build_step(self.build)
 
+    def concat_inputs(self):
+        # (name, input path, duration) of every clip that goes into the concatenated video.
+        # Clips that match the majority stream layout are stream copied as they are; the
+        # others are replaced by their normalized transcode, or left out until it is ready.
+        profile = target_profile(self.clip_info) if self.transcode_cache is not None else None
+        if self.proxies:
+            profile = proxy_profile(profile)
+        inputs = []
+        for video_file, info, duration in zip(self.playlist, self.clip_info, self.clip_durations):
+            clip_path = os.path.join(self.folder_path, video_file)
+            if profile is not None and not is_copy_compatible(info, profile):
+                clip_path = self.normalized_path(clip_path, info, profile)
+                if clip_path is None:
+                    continue
+            inputs.append((video_file, clip_path, duration))
+        return inputs
+
+    def content_hash(self, video_path):
+        # None until the current version of the clip has been hashed in the background
+        entry = self.content_index.entries.get(video_path)
+        if entry is not None and entry[0] == file_signature(video_path):
+            return entry[1]
+        if video_path not in self.hashing:
+            self.hashing.add(video_path)
+            self.content_index.request([video_path])
+        return None
+
+    def clips_hashed(self, results):
+        self.hashing.difference_update(video_path for video_path, _ in results)
+        # Start their transcodes with the next build
+        self.rebuild_timer.start()
+
+    def normalized_path(self, video_path, info, profile):
+        try:
+            content_hash = self.content_hash(video_path)
+        except OSError:
+            return None
+        if content_hash is None:
+            return None
+        key = self.transcode_cache.key_for(content_hash, profile)
+        cached = self.transcode_cache.lookup(key, self.transcode_cache.suffix)
+        if cached is not None or key in self.transcodes or key in self.failed_transcodes:
+            return cached
+        temp_path = self.transcode_cache.temp_path_for(key, self.transcode_cache.suffix)
+        job = FfmpegJob(normalize_command(video_path, temp_path, info, profile), duration=info["duration"])
+        job.finished.connect(lambda job: self.transcode_finished(job, key, temp_path))
+        self.transcodes[key] = job
+        self.transcode_runner.submit(job)
+        return None
+
+    def transcode_finished(self, job, key, temp_path):
+        del self.transcodes[key]
+        if not job.succeeded():
+            self.transcode_cache.discard(temp_path)
+            if not job.cancelled:
+                print(f"Warning: could not normalize {job.command[job.command.index('-i') + 1]}")
+                self.failed_transcodes.add(key)
+            return
+        self.transcode_cache.commit(temp_path, key, self.transcode_cache.suffix)
+        # Pick up the newly normalized clip in the next concatenated video
+        self.rebuild_timer.start()
+
+    def concat_step(self, index, video_path, inputs, timeline):
         # Create a temporary filelist for ffmpeg
-        filelist_path = os.path.join(self.folder_path, f"filelist_{self.current_video_index}.txt")
+        filelist_path = os.path.join(self.folder_path, f"filelist_{index}.txt")
         with open(filelist_path, "w") as f:
-            for video_file in self.playlist:
-                video_path = os.path.join(self.folder_path, video_file)
-                f.write(f"file '{video_path}'\n")
+            for _, clip_path, _ in inputs:
+                f.write(f"file '{clip_path}'\n")
         # Run ffmpeg to concatenate videos
         command = [
             "ffmpeg",
             "-y",  # overwrite output file if exists
+            "-v",
+            "error",
+            "-progress",
+            "pipe:1",
+            "-nostats",
             "-f",
             "concat",
             "-safe",
@@ -134,91 +796,211 @@ class VideoPlayer(QMainWindow):
             filelist_path,
             "-c",
             "copy",
-            self.concatenated_video_path,
+            video_path,
         ]
-        subprocess.run(command)
+        job = FfmpegJob(command, duration=timeline["total_time"] / 1000)
+        return job, lambda job: job.succeeded()
+
+    def manifest_path(self, index):
+        return os.path.join(self.folder_path, f"concatenated_video_{index}.json")
+
+    def load_manifest(self, index):
+        # The manifest lists [name, size, mtime, input path, bytes written] for every
+        # clip already appended to concatenated_video_<index>.ts
+        video_path = os.path.join(self.folder_path, self.concatenated_video_name(index))
+        try:
+            with open(self.manifest_path(index), "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return []
+        # Discard the manifest if the output was truncated or modified behind our back
+        expected_size = manifest[-1][-1] if manifest else 0
+        if not os.path.exists(video_path) or os.path.getsize(video_path) != expected_size:
+            return []
+        return manifest
+
+    def save_manifest(self, index, manifest):
+        manifest_path = self.manifest_path(index)
+        with open(manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(manifest_path + ".tmp", manifest_path)
+
+    def incremental_steps(self, index, video_path, inputs, timeline):
+        # None when a clip has gone before the watcher could report it
+        manifest = self.load_manifest(index)
+        target = []
+        for video_file, clip_path, _ in inputs:
+            try:
+                size, mtime = file_signature(os.path.join(self.folder_path, video_file))
+            except OSError:
+                return None
+            target.append([video_file, size, mtime, clip_path])
+
+        # Reuse the existing output only if it holds an unchanged prefix of the playlist;
+        # a removed, reordered or modified clip forces a rebuild from scratch
+        start = len(manifest)
+        if [entry[:-1] for entry in manifest] != target[:start]:
+            start = 0
+            manifest = []
+        if not manifest:
+            open(video_path, "wb").close()
+            self.save_manifest(index, manifest)
+
+        def append_finished(job, clip_index):
+            if job.succeeded():
+                manifest.append(target[clip_index] + [os.path.getsize(video_path)])
+                self.save_manifest(index, manifest)
+                return True
+            if not job.cancelled:
+                print(f"Warning: could not append {target[clip_index][0]}")
+            # Drop the partial write so the manifest still matches the file
+            os.truncate(video_path, manifest[-1][-1] if manifest else 0)
+            return False
+
+        steps = []
+        cumulative_durations = timeline["cumulative_durations"]
+        for clip_index in range(start, len(target)):
+            clip_path = target[clip_index][3]
+            # Shift timestamps so the appended clip continues where the previous one ended
+            offset = cumulative_durations[clip_index] / 1000
+            command = [
+                "ffmpeg",
+                "-v",
+                "error",
+                "-progress",
+                "pipe:2",
+                "-nostats",
+                "-i",
+                clip_path,
+                "-map",
+                "0:v:0",
+                "-map",
+                "0:a:0?",
+                "-c",
+                "copy",
+                "-output_ts_offset",
+                f"{offset:.3f}",
+                "-f",
+                "mpegts",
+                "pipe:1",
+            ]
+            job = FfmpegJob(
+                command,
+                duration=inputs[clip_index][2] / 1000,
+                output_file=video_path,
+                append=True,
+            )
+            steps.append((job, lambda job, clip_index=clip_index: append_finished(job, clip_index)))
+        return steps
+
+    def start_build_step(self, build):
+        if build["steps"]:
+            job, handler = build["steps"].popleft()
+        else:
+            # Check the finished output before it is allowed on screen
+            job = FfmpegJob(probe_command(build["path"]))
+            handler = lambda job: self.verify_build(build, job)
+            build["verifying"] = True
+        build["job"] = job
+        job.progress.connect(self.build_progress)
+        job.finished.connect(lambda job: self.build_step_finished(build, job, handler))
+        self.build_runner.submit(job)
+
+    def build_step_finished(self, build, job, handler):
+        succeeded = handler(job)
+        if build is not self.build:
+            return
+        if build["cancelled"]:
+            self.build = None
+            if self.rebuild_requested:
+                self.create_concatenated_video()
+            return
+        if not succeeded:
+            self.build = None
+            metrics.cancel("concat_build_seconds")
+            self.setWindowTitle(self.folder_path)
+            return
+        if build["verifying"]:
+            self.build = None
+            return
+        self.start_build_step(build)
+
+    def verify_build(self, build, job):
+        info = parse_probe_output(bytes(job.stdout)) if job.succeeded() else None
+        expected = build["timeline"]["total_time"]
+        if info is None or abs(info["duration"] * 1000 - expected) > 1000 + expected * 0.01:
+            if not job.cancelled:
+                print(f"Warning: {build['path']} did not verify, keeping the current video")
+            return False
+        self.timelines[build["index"]] = build["timeline"]
+        self.ready_video_index = build["index"]
+        metrics.stop("concat_build_seconds")
+        self.setWindowTitle(self.folder_path)
+        if self.current_player.playbackState() == QMediaPlayer.PlaybackState.StoppedState:
+            self.play_video()
+        return True
+
+    def build_progress(self, fraction):
+        self.setWindowTitle(f"{self.folder_path} - building {fraction:.0%}")
 
     def get_video_duration(self, video_file_path):
-        # Use ffprobe to get video duration
-        command = [
-            "ffprobe",
-            "-v",
-            "error",
-            "-show_entries",
-            "format=duration",
-            "-of",
-            "default=noprint_wrappers=1:nokey=1",
-            video_file_path,
-        ]
-        result = subprocess.run(
-            command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
-        )
-        duration = float(result.stdout)
-        return duration * 1000  # Convert to milliseconds
+        # Use the metadata cache, which only runs ffprobe for new or changed files
+        info = self.metadata_cache.get(video_file_path)
+        if info is None:
+            raise ValueError(f"Could not probe {video_file_path}")
+        return info["duration"] * 1000  # Convert to milliseconds
 
     def play_video(self):
+        if self.engine is not None:
+            self.engine.play(0)
+            return
+        if self.stream is not None:
+            if self.stream.is_ready():
+                metrics.start("ttff_seconds", "main", mode=self.mode)
+                self.current_player.setSource(QUrl.fromLocalFile(self.stream.playlist_path()))
+                self.current_player.play()
+            return
+        if self.ready_video_index is None:
+            # Playback starts once the first concatenated video has been verified
+            return
+        self.current_video_index = self.ready_video_index
+        self.ready_video_index = None
+        self.set_timeline(self.timelines[self.current_video_index])
         # Set the source to the concatenated video
-        concatenated_video_name = f"concatenated_video_{self.current_video_index}.mp4"
+        concatenated_video_name = self.concatenated_video_name(self.current_video_index)
         self.concatenated_video_path = os.path.join(self.folder_path, concatenated_video_name)
         url = QUrl.fromLocalFile(self.concatenated_video_path)
+        metrics.start("ttff_seconds", "main", mode=self.mode)
         self.current_player.setSource(url)
         self.current_player.play()
 
+    def set_timeline(self, timeline):
+        self.timeline = timeline
+        self.overlay.set_timeline(timeline["cumulative_durations"], timeline["total_time"])
+
     def update_overlays(self, position):
         # position is in milliseconds
-        total_elapsed_ms = position  # Since we have a single video, total_elapsed_ms is position
-
-        # Convert to timecode format (HH:MM:SS:FF)
-        hours, remainder = divmod(total_elapsed_ms // 1000, 3600)
-        minutes, seconds = divmod(remainder, 60)
-        frames = int((total_elapsed_ms % 1000) * self.fps / 1000)
-
-        total_time = self.total_time  # Total time of the concatenated video
-
-        t_hours, t_remainder = divmod(total_time // 1000, 3600)
-        t_minutes, t_seconds = divmod(t_remainder, 60)
-        t_frames = int((total_time % 1000) * self.fps / 1000)
-
-        timecode = f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}:{int(frames):02d}" + "/" + f"{int(t_hours):02d}:{int(t_minutes):02d}:{int(t_seconds):02d}:{int(t_frames):02d}"
-        self.timecode_item.setPlainText(timecode)
-
-        # Determine the current clip index
-        clip_index = 0
-        while (
-            clip_index < len(self.cumulative_durations) - 1
-            and total_elapsed_ms >= self.cumulative_durations[clip_index + 1]
-        ):
-            clip_index += 1
-
-        # Update clip number label
-        clip_info = f"{clip_index + 1} / {len(self.playlist)}"
-        self.clip_number_item.setPlainText(clip_info)
-
-        # Adjust background rectangles to match text items
-        self.timecode_item.update()
-        timecode_rect = self.timecode_item.boundingRect()
-        self.timecode_bg.setRect(
-            self.timecode_item.x(),
-            self.timecode_item.y(),
-            timecode_rect.width(),
-            timecode_rect.height(),
-        )
+        self.overlay.update_position(position)
 
-        self.clip_number_item.update()
-        clip_number_rect = self.clip_number_item.boundingRect()
-        self.clip_number_bg.setRect(
-            self.clip_number_item.x(),
-            self.clip_number_item.y(),
-            clip_number_rect.width(),
-            clip_number_rect.height(),
-        )
+    def frame_shown(self, frame):
+        # Only connected when metrics are enabled
+        metrics.stop("ttff_seconds", "main")
+        if metrics.is_started("seek_seconds", "main") and frame_near(frame, 0):
+            metrics.stop("seek_seconds", "main")
 
     def media_status_changed(self, status):
         if status == QMediaPlayer.MediaStatus.EndOfMedia:
-            # Rescan the folder and rebuild the playlist
-            self.load_playlist()
-            # Delay playing to allow ffmpeg to finish writing the file
-            QTimer.singleShot(1000, self.play_video)  # Wait 1 second before replaying
+            if self.stream is not None:
+                # The playlist has ended: every clip had been segmented when it was loaded
+                self.restart_stream()
+            elif self.ready_video_index is not None:
+                # A newer concatenated video has been built and verified, switch to it
+                self.play_video()
+            else:
+                # Keep looping the current video
+                metrics.start("seek_seconds", "main", mode=self.mode)
+                self.current_player.setPosition(0)
+                self.current_player.play()
 
     def keyPressEvent(self, event):
         if event.key() == Qt.Key.Key_Escape:
@@ -230,11 +1012,7 @@ class VideoPlayer(QMainWindow):
                 self.showFullScreen()
         elif event.key() == Qt.Key.Key_F3:
             # Toggle visibility of overlays
-            visible = self.timecode_item.isVisible()
-            self.timecode_item.setVisible(not visible)
-            self.timecode_bg.setVisible(not visible)
-            self.clip_number_item.setVisible(not visible)
-            self.clip_number_bg.setVisible(not visible)
+            self.overlay.set_visible(not self.overlay.is_visible())
         else:
             super().keyPressEvent(event)
 
@@ -247,36 +1025,373 @@ class VideoPlayer(QMainWindow):
         self.scene.setSceneRect(0, 0, w, h)
 
         # Resize the video item to fill the scene
-        self.video_item.setSize(QRectF(0, 0, w, h).size())
+        if self.engine is not None:
+            self.engine.setSize(QRectF(0, 0, w, h).size())
+        else:
+            self.video_item.setSize(QRectF(0, 0, w, h).size())
 
-        # Position the timecode_item at bottom center
-        self.timecode_item.update()
-        timecode_rect = self.timecode_item.boundingRect()
-        self.timecode_item.setPos(
-            (w - timecode_rect.width()) / 2, h - timecode_rect.height() - 20
-        )
-        self.timecode_bg.setRect(
-            self.timecode_item.x(),
-            self.timecode_item.y(),
-            timecode_rect.width(),
-            timecode_rect.height(),
-        )
+        # Position the timecode and clip number overlays
+        self.overlay.layout(QRectF(0, 0, w, h))
 
-        # Position the clip_number_item at top right
-        self.clip_number_item.update()
-        clip_number_rect = self.clip_number_item.boundingRect()
-        self.clip_number_item.setPos(w - clip_number_rect.width() - 100, 20)
-        self.clip_number_bg.setRect(
-            self.clip_number_item.x(),
-            self.clip_number_item.y(),
-            clip_number_rect.width(),
-            clip_number_rect.height(),
-        )
+
+class DecodeScheduler(QObject):
+    # Caps how many tiles of a wall decode at once. The focused tile always plays; the
+    # other tiles take turns in slices of slice_ms and hold their last frame in between,
+    # so a 3x3 wall costs max_active decodes instead of nine.
+    def __init__(self, engines, max_active=4, slice_ms=10000, parent=None):
+        super().__init__(parent)
+        self.engines = engines
+        self.max_active = max(1, max_active)
+        self.focus = 0
+        self.turn = 0  # Offset of the unfocused tiles whose turn it is
+        self.active = set()
+        self.timer = QTimer(self)
+        self.timer.setInterval(slice_ms)
+        self.timer.timeout.connect(self.rotate)
+        if len(engines) > self.max_active:
+            self.timer.start()
+
+    def set_focus(self, index):
+        self.focus = index
+        self.schedule()
+
+    def rotate(self):
+        self.turn += self.max_active - 1
+        self.schedule()
+
+    def schedule(self):
+        others = [index for index in range(len(self.engines)) if index != self.focus]
+        active = {self.focus}
+        if others and self.max_active > 1:
+            start = self.turn % len(others)
+            active.update((others[start:] + others[:start])[:self.max_active - 1])
+        for index, engine in enumerate(self.engines):
+            if index in active:
+                engine.resume()
+            else:
+                engine.pause()
+        self.active = active
+        metrics.set("wall_decoding_tiles", len(active))
+
+
+class WallOverlay(QGraphicsItem):
+    # Labels for every tile of a wall painted by one item a few times a second, rather
+    # than a PlaybackOverlay per tile with scene items updated on every positionChanged
+    def __init__(self, wall, fps=25, size=12):
+        super().__init__()
+        self.wall = wall
+        self.fps = fps
+        self.font = QFont("Courier", size)
+        self.font.setStyleHint(QFont.StyleHint.Monospace)
+        self.area = QRectF()
+        self.setZValue(1)
+
+    def boundingRect(self):
+        return self.area
+
+    def layout(self, area):
+        self.prepareGeometryChange()
+        self.area = QRectF(area)
+
+    def paint(self, painter, option, widget=None):
+        painter.setFont(self.font)
+        font_metrics = painter.fontMetrics()
+        for index, tile in enumerate(self.wall.tiles):
+            rect = tile["rect"]
+            text = f"{index + 1}  {tile['name']}  {format_timecode(tile['position'], self.fps)}"
+            text = font_metrics.elidedText(text, Qt.TextElideMode.ElideMiddle, int(rect.width()) - 24)
+            background = QRectF(
+                rect.x() + 8,
+                rect.bottom() - font_metrics.height() - 12,
+                font_metrics.horizontalAdvance(text) + 8,
+                font_metrics.height() + 4,
+            )
+            painter.fillRect(background, QColor(0, 0, 0, 128))
+            painter.setPen(QColor("white"))
+            painter.drawText(background, Qt.AlignmentFlag.AlignCenter, text)
+            if index == self.wall.scheduler.focus and len(self.wall.tiles) > 1:
+                painter.setPen(QPen(QColor("white"), 2))
+                painter.setBrush(Qt.BrushStyle.NoBrush)
+                painter.drawRect(rect.adjusted(1, 1, -1, -1))
+
+
+class VideoWall(QMainWindow):
+    # Several playlists at once in a grid: one tile per folder, or with a single folder
+    # its clips dealt out over tile_count tiles. Every tile is a PlaylistEngine in the
+    # one scene; a DecodeScheduler decides which tiles decode, and tiles other than the
+    # focused one play low-res proxies once they have been built.
+    def __init__(self, folder_paths, tile_count=9, max_active=4, proxies=True, proxy_cache_bytes=20 << 30,
+                 settle_ms=2000):
+        super().__init__()
+        self.folder_paths = folder_paths
+        self.fps = 25
+
+        self.scene = QGraphicsScene()
+        self.view = QGraphicsView(self.scene)
+        self.view.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.view.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.view.setStyleSheet("background: black")
+        self.view.viewport().installEventFilter(self)  # Click a tile to focus it
+        self.view.setFocusPolicy(Qt.FocusPolicy.NoFocus)  # Keys, Tab included, go to the window
+        self.setCentralWidget(self.view)
+
+        # Proxies of every clip, not just the heavy ones: at tile size a 360p copy looks
+        # the same and decodes far cheaper than any full-size source. Every folder keeps
+        # its own metadata and proxy caches, each with the full size limit, as in the
+        # other modes; one runner builds the proxies of all folders one at a time.
+        self.proxy_loaders = {}  # folder path -> ProxyLoader
+        if proxies:
+            proxy_runner = JobRunner(max_concurrent=1, name="proxies", parent=self)
+            for folder_path in folder_paths:
+                loader = ProxyLoader(
+                    ProxyCache(os.path.join(folder_path, WALL_PROXY_CACHE_NAME), proxy_cache_bytes),
+                    MetadataCache(os.path.join(folder_path, METADATA_CACHE_NAME)),
+                    proxy_runner,
+                    height=WALL_PROXY_HEIGHT,
+                    heavy_only=False,
+                    max_queued=256,
+                    parent=self,
+                )
+                loader.thumbnailReady.connect(self.proxy_ready)
+                self.proxy_loaders[folder_path] = loader
+
+        if len(folder_paths) > 1:
+            tile_count = len(folder_paths)
+        self.tiles = []
+        for index in range(tile_count):
+            engine = PlaylistEngine(
+                self.scene, resolve=lambda path, index=index: self.playback_path(index, path), parent=self
+            )
+            engine.set_muted(True)
+            folder_path = folder_paths[index] if len(folder_paths) > 1 else folder_paths[0]
+            tile = {"engine": engine, "folder": folder_path, "name": "", "position": 0, "rect": QRectF()}
+            engine.positionChanged.connect(lambda position, tile=tile: self.tile_position_changed(tile, position))
+            engine.clipChanged.connect(lambda clip_index, tile=tile: self.tile_clip_changed(tile, clip_index))
+            self.tiles.append(tile)
+        self.scheduler = DecodeScheduler([tile["engine"] for tile in self.tiles], max_active, parent=self)
+        self.tiles[0]["engine"].set_muted(False)
+
+        self.overlay = WallOverlay(self, fps=self.fps)
+        self.scene.addItem(self.overlay)
+        self.overlay_timer = QTimer(self)
+        self.overlay_timer.setInterval(250)
+        self.overlay_timer.timeout.connect(self.overlay.update)
+        self.overlay_timer.start()
+
+        self.assignments = {}  # path -> tile, for the clips of a single folder
+        self.watchers = []
+        for folder_path in folder_paths:
+            watcher = FolderWatcher(folder_path, accept=is_clip_file, settle_ms=settle_ms, parent=self)
+            watcher.filesAdded.connect(self.update_playlists)
+            watcher.filesRemoved.connect(self.update_playlists)
+            watcher.ready.connect(self.update_playlists)
+            self.watchers.append(watcher)
+        for watcher in self.watchers:
+            watcher.start()
+
+    def update_playlists(self, names=None):
+        if len(self.watchers) > 1:
+            playlists = [
+                [os.path.join(watcher.folder_path, name) for name in sorted(watcher.files())]
+                for watcher in self.watchers
+            ]
+        else:
+            watcher = self.watchers[0]
+            paths = {os.path.join(watcher.folder_path, name) for name in watcher.files()}
+            self.assignments = {path: index for path, index in self.assignments.items() if path in paths}
+            # A clip stays on its tile for as long as it exists; new clips go to the tiles
+            # with the fewest clips, so an added or removed file never moves other clips
+            counts = [0] * len(self.tiles)
+            for index in self.assignments.values():
+                counts[index] += 1
+            for path in sorted(paths - self.assignments.keys()):
+                index = counts.index(min(counts))
+                self.assignments[path] = index
+                counts[index] += 1
+            playlists = [[] for _ in self.tiles]
+            for path in sorted(self.assignments):
+                playlists[self.assignments[path]].append(path)
+        for tile, paths in zip(self.tiles, playlists):
+            engine = tile["engine"]
+            if paths != engine.paths:
+                # Positions are shown per clip, not over the whole playlist
+                engine.set_playlist(paths, [0] * (len(paths) + 1))
+            if not paths:
+                tile["name"] = ""
+        self.scheduler.schedule()
+
+    def playback_path(self, index, video_path):
+        proxy_loader = self.proxy_loaders.get(self.tiles[index]["folder"])
+        if proxy_loader is None or index == self.scheduler.focus:
+            return video_path
+        return proxy_loader.playback_path(video_path)
+
+    def proxy_ready(self, video_path, proxy_path):
+        # Swap unfocused tiles that are showing the original over to the new proxy
+        for index, tile in enumerate(self.tiles):
+            engine = tile["engine"]
+            if index != self.scheduler.focus and video_path in (slot["path"] for slot in engine.slots):
+                engine.reload()
+
+    def tile_position_changed(self, tile, position):
+        tile["position"] = position  # Painted by the overlay timer
+
+    def tile_clip_changed(self, tile, clip_index):
+        video_path = tile["engine"].paths[clip_index]
+        tile["name"] = os.path.basename(video_path)
+        if len(self.watchers) > 1:
+            tile["name"] = f"{os.path.basename(os.path.dirname(video_path))}/{tile['name']}"
+
+    def set_focus(self, index):
+        previous = self.scheduler.focus
+        if index == previous or not 0 <= index < len(self.tiles):
+            return
+        self.scheduler.set_focus(index)
+        self.tiles[previous]["engine"].set_muted(True)
+        self.tiles[index]["engine"].set_muted(False)
+        if self.proxy_loaders:
+            # The focused tile plays the original, the one it replaces goes back to its proxy
+            self.tiles[previous]["engine"].reload()
+            self.tiles[index]["engine"].reload()
+        self.overlay.update()
+
+    def tile_at(self, point):
+        for index, tile in enumerate(self.tiles):
+            if tile["rect"].contains(point):
+                return index
+        return -1
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Type.MouseButtonPress:
+            self.set_focus(self.tile_at(self.view.mapToScene(event.position().toPoint())))
+        return super().eventFilter(watched, event)
+
+    def keyPressEvent(self, event):
+        key = event.key()
+        if key == Qt.Key.Key_Escape:
+            self.close()
+        elif key == Qt.Key.Key_F11:
+            if self.isFullScreen():
+                self.showNormal()
+            else:
+                self.showFullScreen()
+        elif key == Qt.Key.Key_F3:
+            self.overlay.setVisible(not self.overlay.isVisible())
+        elif key == Qt.Key.Key_Tab:
+            self.set_focus((self.scheduler.focus + 1) % len(self.tiles))
+        elif Qt.Key.Key_1.value <= key <= Qt.Key.Key_9.value:
+            self.set_focus(key - Qt.Key.Key_1.value)
+        else:
+            super().keyPressEvent(event)
+
+    def focusNextPrevChild(self, next):
+        return False  # Keep Tab for cycling the focused tile
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        w = self.view.viewport().width()
+        h = self.view.viewport().height()
+        self.scene.setSceneRect(0, 0, w, h)
+
+        columns = math.ceil(math.sqrt(len(self.tiles)))
+        rows = math.ceil(len(self.tiles) / columns)
+        tile_width = w / columns
+        tile_height = h / rows
+        for index, tile in enumerate(self.tiles):
+            row, column = divmod(index, columns)
+            tile["rect"] = QRectF(column * tile_width, row * tile_height, tile_width, tile_height)
+            tile["engine"].setPos(tile["rect"].x(), tile["rect"].y())
+            tile["engine"].setSize(tile["rect"].size())
+        self.overlay.layout(QRectF(0, 0, w, h))
 
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    folder_path = '/path/to/videos'  # Replace with the path to your folder
-    player = VideoPlayer(folder_path)
+    parser = argparse.ArgumentParser(description="Loop all videos in a watch folder")
+    parser.add_argument("folder_paths", nargs="*", default=["/path/to/videos"], metavar="folder_path")
+    parser.add_argument(
+        "--mode",
+        choices=["concat", "playlist", "stream", "wall"],
+        default="concat",
+        help="concat: play an ffmpeg-concatenated copy; playlist: play clips directly, gaplessly; "
+        "stream: play a growing HLS stream that starts after the first clip; "
+        "wall: play several folders, or several clips of one folder, side by side in a grid",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only append newly arrived clips to the concatenated video",
+    )
+    parser.add_argument(
+        "--no-normalize",
+        dest="normalize",
+        action="store_false",
+        help="concatenate clips as they are, even if their codecs or resolutions differ",
+    )
+    parser.add_argument(
+        "--normalize-cache-gb",
+        type=float,
+        default=20,
+        help="size limit of the cache of normalized clips",
+    )
+    parser.add_argument(
+        "--proxies",
+        action="store_true",
+        help="play 540p H.264 proxies: of heavy clips in playlist mode, of every clip in the concatenated video",
+    )
+    parser.add_argument("--proxy-cache-gb", type=float, default=20, help="size limit of the proxy cache")
+    parser.add_argument(
+        "--settle-ms",
+        type=int,
+        default=2000,
+        help="how long a file must stay unchanged before it is played; this also delays startup",
+    )
+    parser.add_argument("--tiles", type=int, default=9, help="tiles of a wall of one folder")
+    parser.add_argument(
+        "--max-decodes",
+        type=int,
+        default=4,
+        help="tiles of a wall that play at the same time; the others take turns. Not counted: the "
+        "first frame of its next clip that every tile keeps decoded, and the one proxy transcode "
+        "that runs alongside",
+    )
+    parser.add_argument(
+        "--no-tile-proxies",
+        dest="tile_proxies",
+        action="store_false",
+        help="play the originals in every tile of a wall instead of 360p proxies",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        help="write playback and build timings here; .json for JSON, anything else Prometheus text format",
+    )
+    parser.add_argument("--metrics-interval", type=float, default=10, help="seconds between metrics writes")
+    args, qt_args = parser.parse_known_args()
+    if args.mode != "wall" and len(args.folder_paths) > 1:
+        parser.error("several folders can only be played in wall mode")
+    app = QApplication(sys.argv[:1] + qt_args)
+    if args.metrics_file:
+        metrics.enable(args.metrics_file, "watch_folder_player", args.metrics_interval)
+    if args.mode == "wall":
+        player = VideoWall(
+            args.folder_paths,
+            tile_count=args.tiles,
+            max_active=args.max_decodes,
+            proxies=args.tile_proxies,
+            proxy_cache_bytes=int(args.proxy_cache_gb * (1 << 30)),
+            settle_ms=args.settle_ms,
+        )
+    else:
+        player = VideoPlayer(
+            args.folder_paths[0],
+            mode=args.mode,
+            incremental=args.incremental,
+            normalize=args.normalize,
+            normalize_cache_bytes=int(args.normalize_cache_gb * (1 << 30)),
+            proxies=args.proxies,
+            proxy_cache_bytes=int(args.proxy_cache_gb * (1 << 30)),
+            settle_ms=args.settle_ms,
+        )
     player.showFullScreen()
-    sys.exit(app.exec())
+    status = app.exec()
+    metrics.close()
+    sys.exit(status)